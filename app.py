@@ -2,6 +2,7 @@ import streamlit as st
 from PIL import Image
 import config
 import requests
+import json
 
 # --- Page config
 st.set_page_config(page_title="IncunabuLM", layout="wide")
@@ -28,6 +29,66 @@ def format_as_poem(text: str) -> str:
     text = text.replace('; ', ';<br>')
     return text
 
+def render_output(placeholder, text: str):
+    placeholder.markdown(
+        f'<div class="output-container" style="height: 100%;">{format_as_poem(text)}</div>',
+        unsafe_allow_html=True
+    )
+
+def stream_generation(data_to_predict: dict, placeholder) -> str:
+    """
+    Read Server-Sent Events from the streaming endpoint and render the text as it arrives.
+
+    return: full generated text
+    """
+    text = ""
+    with requests.post(
+        config.STREAM_API_URL,
+        json=data_to_predict,
+        headers={"Content-Type": "application/json"},
+        stream=True,
+        timeout=(5, 30)
+    ) as response:
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            if event.get("text"):
+                text += event["text"]
+                render_output(placeholder, text)
+            if event.get("trim"):
+                # The server cut the text after its last complete sentence
+                text = text[:-event["trim"]]
+                render_output(placeholder, text)
+    return text
+
+def generate_samples(data_to_predict: dict) -> list:
+    """
+    Request several versions in one batched /generate call.
+
+    return: list of generated texts
+    """
+    response = requests.post(
+        config.API_URL,
+        json=data_to_predict,
+        headers={"Content-Type": "application/json"},
+        timeout=(5, 120)
+    )
+    response.raise_for_status()
+    return response.json()["samples"]
+
+def render_samples(container, texts: list):
+    if len(texts) == 1:
+        render_output(container.empty(), texts[0])
+        return
+    for column, text in zip(container.columns(len(texts)), texts):
+        with column:
+            render_output(st.empty(), text)
+
 def main():
     """
     Main logic. Build app, get hiperparams, show prediction from API" 
@@ -37,8 +98,8 @@ def main():
         scribe_image, style = load_resources()
         st.markdown(f'<style>{style}</style>', unsafe_allow_html=True)
 
-        if 'generated_text' not in st.session_state:
-            st.session_state.generated_text = "Czekam na twe słowa, panie..."
+        if 'generated_texts' not in st.session_state:
+            st.session_state.generated_texts = ["Czekam na twe słowa, panie..."]
 
         st.markdown('<h1 class="title-font">📜 IncunabuLM 📜</h1>', unsafe_allow_html=True)
         st.write("---")
@@ -59,11 +120,7 @@ def main():
 
         # Middle column
         with col2:
-            formatted_output = format_as_poem(st.session_state.generated_text)
-            st.markdown(
-                f'<div class="output-container" style="height: 100%;">{formatted_output}</div>',
-                unsafe_allow_html=True
-            )
+            output_container = st.container()
 
         # Right column
         with col3:
@@ -76,6 +133,10 @@ def main():
                 min_value=20, max_value=500, value=150,
                 key="max_length_slider"
             )
+            num_samples = st.slider("Liczba wersji:", min_value=1, max_value=4, value=1, key="num_samples_slider")
+
+        if not button_pressed:
+            render_samples(output_container, st.session_state.generated_texts)
         
         # Generation logic
         if button_pressed:
@@ -88,16 +149,12 @@ def main():
                         "top_k" : top_k,
                         "repetition_penalty" : repetition_penalty
                     }
-                    response = requests.post(
-                        config.API_URL, 
-                        json=data_to_predict,
-                        headers={"Content-Type": "application/json"},
-                        timeout=30
-                    )
-                    response.raise_for_status()
-
-                    result = response.json()
-                    st.session_state.generated_text = result["response"]
+                    if num_samples == 1:
+                        text = stream_generation(data_to_predict, output_container.empty())
+                        st.session_state.generated_texts = [text]
+                    else:
+                        data_to_predict["num_samples"] = num_samples
+                        st.session_state.generated_texts = generate_samples(data_to_predict)
                     st.rerun()
             else:
                 st.warning("Mistrzu, podaj choć słowo, bym mógł zacząć...")
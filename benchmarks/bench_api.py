@@ -0,0 +1,117 @@
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from tokenizers import Tokenizer
+
+import config
+from benchmarks.common import FULL_CONFIG, SMALL_CONFIG, build_model, environment, peak_rss_mb, write_results
+
+# End-to-end throughput of the FastAPI server under concurrent load. The server
+# runs in this process on a background thread with a randomly initialized model
+# attached through main.setup_components, so no trained weights are needed;
+# requests come from a thread pool acting as concurrent clients.
+#
+#   python -m benchmarks.bench_api [--concurrency 1 4 16] [--requests 64] [--output results.json]
+
+PROMPT = "A gdy Bolesław Chrobry na tronie zasiadł"
+
+def start_server(app, host, port):
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return (time.perf_counter() - t0) * 1000
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def run_load(url, payload, concurrency, num_requests):
+    latencies, errors = [], 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(post, url, payload) for _ in range(num_requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    seconds = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': num_requests,
+        'errors': errors,
+        'seconds': seconds,
+        'requests_per_sec': len(latencies) / seconds,
+        'latency_ms': {
+            'mean': statistics.fmean(latencies) if latencies else None,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'max': latencies[-1] if latencies else None,
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /generate throughput under concurrent load.")
+    parser.add_argument('--full', action='store_true', help="Use the model sizes from config.py instead of the small config")
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument('--max-tokens', type=int, default=64)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help="JSON output path (default: benchmarks/results/api-<commit>.json)")
+    args = parser.parse_args()
+
+    import main as api
+
+    model_cfg = FULL_CONFIG if args.full else SMALL_CONFIG
+    model = build_model(model_cfg, args.device)
+    api.setup_components(api.app, Tokenizer.from_file(config.TOKENIZER_PATH), model,
+                         sum(p.numel() for p in model.parameters()))
+    server, thread = start_server(api.app, '127.0.0.1', args.port)
+
+    url = f"http://127.0.0.1:{args.port}/generate"
+    payload = {'context': PROMPT, 'max_tokens': args.max_tokens, 'top_k': 50}
+    results = {
+        'environment': environment(args.device),
+        'model': model_cfg,
+        'max_batch_size': config.MAX_BATCH_SIZE,
+        'max_tokens': args.max_tokens,
+        'load': [],
+    }
+    try:
+        post(url, payload)  # warm-up
+        for concurrency in args.concurrency:
+            result = run_load(url, payload, concurrency, args.requests)
+            results['load'].append(result)
+            print(f"  concurrency {concurrency:3d}: {result['requests_per_sec']:6.2f} req/s, "
+                  f"p50 {result['latency_ms']['p50']:.0f} ms, p95 {result['latency_ms']['p95']:.0f} ms, "
+                  f"{result['errors']} errors")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    print(f"Peak RSS: {results['peak_rss_mb']:.0f} MB")
+    write_results('api', results, args.output)
+
+if __name__ == '__main__':
+    main()
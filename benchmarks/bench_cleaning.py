@@ -0,0 +1,73 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.cleaning_golden import golden_check, load_books, reference_clean_text, reference_is_polish
+from benchmarks.common import environment, peak_rss_mb, write_results
+from utilis import cleaning
+
+# Throughput of utilis/cleaning.py against the cleaning functions it replaced, after
+# the golden check of benchmarks/cleaning_golden.py that both give identical output:
+#   reference - the per-call versions from get_training_data.py / get_finetuning_poems.py
+#   cleaning  - precompiled patterns, one-scan name removal and language scoring
+#   pool      - clean_corpus over a directory of corpus files on a process pool
+#
+# Documents are the synthetic books of cleaning_golden.py unless --input gives a
+# corpus file.
+#
+#   python -m benchmarks.bench_cleaning [--documents 400] [--workers 4] [--input data/data_final.txt]
+
+def throughput(fn, books, total_mb):
+    t0 = time.perf_counter()
+    for text, title, authors in books:
+        fn(text, title, authors)
+    elapsed = time.perf_counter() - t0
+    return {'seconds': elapsed, 'mb_per_s': total_mb / elapsed, 'documents_per_s': len(books) / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and golden-check utilis/cleaning.py.")
+    parser.add_argument('--documents', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--input', default=None, help="Corpus file with <|endoftext|>-separated documents (default: synthetic books)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    books = load_books(args, rng)
+    total_mb = sum(len(text.encode('utf-8')) for text, _, _ in books) / 2**20
+    print(f"{len(books)} documents, {total_mb:.1f} MB")
+
+    mismatches = golden_check(books)
+    print(f"Golden check: {'identical output' if mismatches == 0 else f'{mismatches} mismatches'}")
+
+    results = {'environment': environment('cpu'), 'documents': len(books), 'megabytes': total_mb, 'golden_mismatches': mismatches}
+    for name, fn in (
+        ('reference', lambda text, title, authors: reference_is_polish(text) and reference_clean_text(text, title, authors, poems=True)),
+        ('cleaning', lambda text, title, authors: cleaning.is_polish(text) and cleaning.clean_text(text, title, authors, latin=True, surname_needs_first_name=True)),
+    ):
+        results[name] = throughput(fn, books, total_mb)
+        print(f"{name:>10}: {results[name]['mb_per_s']:.1f} MB/s, {results[name]['documents_per_s']:.0f} documents/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, 'raw'), os.path.join(tmp, 'clean')
+        os.makedirs(input_dir)
+        shards = max(1, args.workers)
+        for i in range(shards):
+            with open(os.path.join(input_dir, f'part_{i:03d}.txt'), 'w', encoding='utf-8') as f:
+                f.write(f"\n{cleaning.END_OF_TEXT_TOKEN}\n".join(text for text, _, _ in books[i::shards]))
+        t0 = time.perf_counter()
+        cleaning.clean_corpus(input_dir, output_dir, workers=args.workers, latin=True)
+        elapsed = time.perf_counter() - t0
+    results['pool'] = {'workers': args.workers, 'seconds': elapsed, 'mb_per_s': total_mb / elapsed, 'documents_per_s': len(books) / elapsed}
+    print(f"{'pool':>10}: {results['pool']['mb_per_s']:.1f} MB/s with {args.workers} workers")
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    write_results('cleaning', results, args.output)
+    sys.exit(0 if mismatches == 0 else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+
+import torch
+
+from benchmarks.common import FULL_CONFIG, SMALL_CONFIG, build_model, environment, peak_rss_mb, time_ms, write_results
+
+# Latency of TransformerDecoder itself, without the API:
+#   prefill  - one forward pass over a prompt of each length into an empty KV cache
+#   decode   - one cached single-token step with a context of each length
+#   generate - end-to-end model.generate tokens per second
+#
+#   python -m benchmarks.bench_model [--full] [--device cuda] [--output results.json]
+
+def lengths_up_to(block_size, start=16):
+    lengths = []
+    n = start
+    while n < block_size:
+        lengths.append(n)
+        n *= 4
+    return lengths + [block_size]
+
+def bench_prefill(model, lengths, device, repeat):
+    results = []
+    for length in lengths:
+        idx = torch.randint(0, model.lm_head.out_features, (1, length), device=device)
+        timing = time_ms(lambda: model(idx, kv_cache=model.new_cache()), device, repeat)
+        results.append({'prompt_tokens': length, **timing, 'tokens_per_sec': 1000 * length / timing['median_ms']})
+        print(f"  prefill {length:5d} tokens: {timing['median_ms']:8.2f} ms")
+    return results
+
+def bench_decode(model, lengths, device, repeat):
+    results = []
+    for length in lengths:
+        # The context fills the cache, the timed step adds token number length + 1
+        context = min(length, model.block_size - 1)
+        cache = model.new_cache()
+        model(torch.randint(0, model.lm_head.out_features, (1, context), device=device), kv_cache=cache)
+        token = torch.randint(0, model.lm_head.out_features, (1, 1), device=device)
+
+        def step():
+            model(token, kv_cache=cache)
+            cache.crop(context)
+
+        timing = time_ms(step, device, repeat)
+        results.append({'context_tokens': context, **timing})
+        print(f"  decode at {context:5d} tokens: {timing['median_ms']:8.2f} ms/token")
+    return results
+
+def bench_generate(model, device, prompt_tokens, new_tokens, repeat):
+    idx = torch.randint(0, model.lm_head.out_features, (1, prompt_tokens), device=device)
+    timing = time_ms(lambda: model.generate(idx, new_tokens, top_k=50), device, repeat, warmup=1)
+    result = {'prompt_tokens': prompt_tokens, 'new_tokens': new_tokens, **timing,
+              'tokens_per_sec': 1000 * new_tokens / timing['median_ms']}
+    print(f"  generate {new_tokens} tokens: {result['tokens_per_sec']:.1f} tokens/s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TransformerDecoder prefill, decode and generate latency.")
+    parser.add_argument('--full', action='store_true', help="Use the model sizes from config.py instead of the small config")
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--new-tokens', type=int, default=64)
+    parser.add_argument('--output', help="JSON output path (default: benchmarks/results/model-<commit>.json)")
+    args = parser.parse_args()
+
+    model_cfg = FULL_CONFIG if args.full else SMALL_CONFIG
+    model = build_model(model_cfg, args.device)
+    lengths = lengths_up_to(model.block_size)
+
+    results = {'environment': environment(args.device), 'model': model_cfg}
+    with torch.inference_mode():
+        print("Prefill")
+        results['prefill'] = bench_prefill(model, lengths, args.device, args.repeat)
+        print("Decode")
+        results['decode'] = bench_decode(model, [1] + lengths, args.device, args.repeat)
+        print("Generate")
+        results['generate'] = bench_generate(model, args.device, 16, args.new_tokens, max(1, args.repeat // 5))
+    results['peak_rss_mb'] = peak_rss_mb()
+    print(f"Peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+    write_results('model', results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import random
+import re
+import sys
+
+from utilis import cleaning
+
+# Golden check of utilis/cleaning.py against the cleaning functions it replaced
+# (the per-call versions from get_training_data.py / get_finetuning_poems.py):
+# both must give identical output on every document. Needs only the scraper
+# dependencies, no torch; benchmarks/bench_cleaning.py runs the same check before
+# timing them.
+#
+# Documents are synthetic Wolne Lektury-like books (header, title and author names
+# scattered through the text, chapters, pages, footer) unless --input gives a corpus
+# file, whose documents get a synthetic title and author.
+#
+#   python -m benchmarks.cleaning_golden [--documents 400] [--input data/data_final.txt]
+
+# --- Reference implementations, as they were in the scrapers ---
+
+def reference_is_polish(text):
+    sample = text[:cleaning.LANGUAGE_SAMPLE_CHARS].lower()
+    words = re.findall(r'\b\w+\b', sample)
+    for lang, stop_words_set in cleaning.STOP_WORDS.items():
+        count = sum(1 for word in words if word in stop_words_set)
+        if count > cleaning.LANGUAGE_DETECTION_THRESHOLD:
+            return False
+    return True
+
+def reference_remove_latin(text):
+    latin_words_pattern = r'\b(et|in|est|cum|ad|quod|qui|non|ut|de|aut|sed|per|quo|sunt|enim|vero|etiam|nam|autem|tamen|ita|sic|vel|ac|ab|ex|hic|ille|is|idem|ipse|iste|hic|haec|hoc|nunc|tunc|semper|saecula|saeculorum|amen)\b'
+    cleaned_text = re.sub(latin_words_pattern, '', text, flags=re.IGNORECASE)
+    cleaned_text = re.sub(r'\s{2,}', ' ', cleaned_text)
+    return cleaned_text
+
+def reference_clean_text(text, title, authors, poems=False):
+    cleaned_text = text
+    footer_patterns = [
+        r'-----*', r'Przypisy', r'Ten utwór nie jest objęty majątkowym prawem autorskim', r'Źródło:'
+    ]
+    footer_regex = re.compile(r'(' + '|'.join(footer_patterns) + r')', re.IGNORECASE)
+    cleaned_text = footer_regex.split(cleaned_text, 1)[0]
+    last_dash_index = cleaned_text.rfind('---')
+    if last_dash_index != -1:
+        cleaned_text = cleaned_text[last_dash_index + 3:]
+    if title:
+        cleaned_text = re.sub(re.escape(title), '', cleaned_text, flags=re.IGNORECASE)
+    for author_info in authors:
+        full_name = author_info.get("name", "")
+        if full_name:
+            cleaned_text = re.sub(re.escape(full_name), '', cleaned_text, flags=re.IGNORECASE)
+            if poems and ' ' not in full_name:
+                continue
+            last_name = full_name.split()[-1]
+            if len(last_name) > 3:
+                cleaned_text = re.sub(re.escape(last_name), '', cleaned_text, flags=re.IGNORECASE)
+    cleaned_text = re.sub(r'^.*ISBN.*$', '', cleaned_text, flags=re.MULTILINE)
+    date_pattern = r'^\s*(poniedziałek|wtorek|środa|czwartek|piątek|sobota|niedziela),\s*\d{1,2}\s+\w+\s+\d{4}\s*$'
+    cleaned_text = re.sub(date_pattern, '', cleaned_text, flags=re.MULTILINE | re.IGNORECASE)
+    chapter_regex = r'^\s*(ROZDZIAŁ|rozdział|KSIĘGA|Księga|PIEŚŃ|Pieśń|AKT|Akt)\s+[IVXLCDM\d]+\s*$'
+    cleaned_text = re.sub(chapter_regex, '', cleaned_text, flags=re.MULTILINE)
+    page_regex = r'\[\s*strona\s+\d+\s*\]'
+    cleaned_text = re.sub(page_regex, '', cleaned_text)
+    if poems:
+        cleaned_text = reference_remove_latin(cleaned_text)
+    cleaned_text = re.sub(r'\n\s*\n', '\n', cleaned_text)
+    return cleaned_text.strip()
+
+# --- Synthetic corpus ---
+
+WORDS = ('litwo ojczyzno moja ty jesteś jak zdrowie ile cię trzeba cenić ten tylko się dowie kto cię stracił '
+         'dziś piękność twą w całej ozdobie widzę i opisuję bo tęsknię po tobie').split()
+FOREIGN_WORDS = 'et in est quod amen the and das der'.split()
+TITLES = ('Pan Tadeusz', 'Treny', 'Dziady', 'Ballady i romanse', 'Sonety krymskie', 'Fraszki', 'Monachomachia', 'Beniowski')
+FIRST_NAMES = ('Adam', 'Jan', 'Ignacy', 'Juliusz', 'Anna', 'Maria')
+LAST_NAMES = ('Mickiewicz', 'Kochanowski', 'Krasicki', 'Słowacki', 'Kowalska', 'Konopnicka', 'Rej')
+
+def synthetic_book(rng, paragraphs=400):
+    title = rng.choice(TITLES)
+    names = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(rng.randint(1, 2))]
+    if rng.random() < 0.2:
+        names.append(rng.choice(LAST_NAMES))
+    lines = [names[0], title, 'ISBN 978-83-288-0000-0', '---', '']
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            lines.append(f"ROZDZIAŁ {i // 20 + 1}")
+        words = [rng.choice(FOREIGN_WORDS if rng.random() < 0.02 else WORDS) for _ in range(rng.randint(20, 60))]
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words)), rng.choice([title, names[0], names[0].split()[-1]]))
+        lines.append(' '.join(words) + f" [strona {i + 1}]")
+        lines.append('')
+    lines += ['-----', 'Ten utwór nie jest objęty majątkowym prawem autorskim', 'Źródło: http://wolnelektury.pl']
+    return '\n'.join(lines), title, [{'name': name} for name in names]
+
+def load_books(args, rng):
+    if args.input is None:
+        return [synthetic_book(rng) for _ in range(args.documents)]
+    books = []
+    for text in cleaning.iter_documents(args.input):
+        if text.strip():
+            books.append((text, rng.choice(TITLES), [{'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"}]))
+        if len(books) == args.documents:
+            break
+    return books
+
+def golden_check(books):
+    """Number of documents on which cleaning.py differs from the reference; prints the first one."""
+    mismatches = 0
+    for text, title, authors in books:
+        for poems in (False, True):
+            expected = reference_clean_text(text, title, authors, poems)
+            actual = cleaning.clean_text(text, title, authors, latin=poems, surname_needs_first_name=poems)
+            if expected != actual or reference_is_polish(text) != cleaning.is_polish(text):
+                if mismatches == 0:
+                    print(f"Mismatch for '{title}' ({'poems' if poems else 'training'} variant)")
+                mismatches += 1
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that utilis/cleaning.py matches the cleaning it replaced.")
+    parser.add_argument('--documents', type=int, default=400)
+    parser.add_argument('--input', default=None, help="Corpus file with <|endoftext|>-separated documents (default: synthetic books)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    books = load_books(args, random.Random(args.seed))
+    mismatches = golden_check(books)
+    print(f"Golden check on {len(books)} documents: {'identical output' if mismatches == 0 else f'{mismatches} mismatches'}")
+    sys.exit(0 if mismatches == 0 else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import torch
+
+import config
+from src.model import TransformerDecoder
+
+# Small enough to benchmark on a laptop CPU, but with the real vocabulary and
+# context length so the embedding, lm_head and attention shapes stay realistic.
+SMALL_CONFIG = {
+    'VOCAB_SIZE': config.VOCAB_SIZE,
+    'N_EMBD': 256,
+    'N_HEAD': 4,
+    'N_LAYER': 4,
+    'BLOCK_SIZE': config.BLOCK_SIZE,
+    'DROPOUT': 0.0,
+}
+FULL_CONFIG = {name: getattr(config, name) for name in SMALL_CONFIG} | {'DROPOUT': 0.0}
+
+def build_model(model_cfg, device='cpu', seed=0):
+    """Randomly initialized TransformerDecoder; the timings do not depend on the weights."""
+    torch.manual_seed(seed)
+    model = TransformerDecoder(model_cfg['VOCAB_SIZE'], model_cfg['N_EMBD'], model_cfg['BLOCK_SIZE'],
+                               model_cfg['N_HEAD'], model_cfg['N_LAYER'], model_cfg['DROPOUT'])
+    return model.to(device).eval()
+
+def synchronize(device):
+    if str(device).startswith('cuda'):
+        torch.cuda.synchronize()
+
+def time_ms(fn, device='cpu', repeat=10, warmup=2):
+    """Median and mean wall time of fn() in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        synchronize(device)
+        t0 = time.perf_counter()
+        fn()
+        synchronize(device)
+        times.append((time.perf_counter() - t0) * 1000)
+    return {'median_ms': statistics.median(times), 'mean_ms': statistics.fmean(times), 'min_ms': min(times)}
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment(device):
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'device': str(device),
+        'threads': torch.get_num_threads(),
+    }
+
+def write_results(name, results, output=None):
+    """Write results as JSON, by default to benchmarks/results/<name>-<commit>.json."""
+    if output is None:
+        output = os.path.join(os.path.dirname(__file__), 'results', f"{name}-{results['environment']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return output
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+from utilis import dedup
+from utilis.corpus_index import write_documents
+
+# Recall of utilis/dedup.py on planted near-duplicates: unrelated base documents,
+# each with a copy in which a random share of words was replaced, so the copies
+# span a range of true Jaccard similarities. The true similarity of every pair is
+# measured on the exact shingle sets and the pairs are bucketed by it. Fails if a
+# pair at least --margin above the threshold is missed too often, or if a document
+# was removed for a kept one whose true similarity is far below the threshold.
+# Needs only numpy, no torch.
+#
+#   python -m benchmarks.dedup_recall [--documents 2000] [--threshold 0.8] [--workers 4]
+
+VOCABULARY = 5000
+MAX_REPLACED = 0.06  # share of replaced words, from identical copies down to J of about 0.55
+MIN_RECALL = 0.95
+FALSE_POSITIVE_MARGIN = 0.1
+
+def jaccard(a, b):
+    return len(np.intersect1d(a, b)) / len(np.union1d(a, b))
+
+def planted_corpus(rng, documents):
+    """Shuffled documents and the (base, copy) document numbers of the planted pairs."""
+    words = [f"słowo{i}" for i in range(VOCABULARY)]
+    bases = [[rng.choice(words) for _ in range(rng.randint(80, 400))] for _ in range(documents)]
+    texts = [' '.join(base) for base in bases]
+    pairs = []
+    for i, base in enumerate(bases[:documents // 2]):
+        copy = list(base)
+        for _ in range(round(rng.uniform(0, MAX_REPLACED) * len(copy))):
+            copy[rng.randrange(len(copy))] = rng.choice(words)
+        pairs.append((i, len(texts)))
+        texts.append(' '.join(copy))
+    order = list(range(len(texts)))
+    rng.shuffle(order)
+    position = {doc: n for n, doc in enumerate(order)}
+    return [texts[doc] for doc in order], [(position[a], position[b]) for a, b in pairs]
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall of utilis/dedup.py on planted near-duplicates.")
+    parser.add_argument('--documents', type=int, default=2000, help="Base documents, half of them get a near-duplicate")
+    parser.add_argument('--threshold', type=float, default=dedup.THRESHOLD)
+    parser.add_argument('--margin', type=float, default=0.05, help="Pairs at least this far above threshold must be found")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    texts, pairs = planted_corpus(random.Random(args.seed), args.documents)
+    shingles = [dedup.shingle_hashes(text) for text in texts]
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, 'corpus.txt')
+        write_documents(corpus, texts)
+        report = dedup.deduplicate(corpus, os.path.join(tmp, 'dedup.txt'), os.path.join(tmp, 'report.json'),
+                                   threshold=args.threshold, workers=args.workers)
+
+    cluster = {}
+    for n, c in enumerate(report['clusters']):
+        for doc in [c['kept']] + c['removed']:
+            cluster[doc['document']] = n
+    found = lambda a, b: a in cluster and cluster.get(a) == cluster.get(b)
+
+    edges = np.arange(0.5, 1.05, 0.05)
+    print(f"bands {report['bands']} x rows {report['rows']}, threshold {args.threshold}")
+    print(f"{'true J':>12} {'pairs':>6} {'found':>6} {'recall':>7}")
+    similarities = np.array([jaccard(shingles[a], shingles[b]) for a, b in pairs])
+    hits = np.array([found(a, b) for a, b in pairs])
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        in_bucket = (similarities >= lo) & (similarities < hi + (hi >= 1))
+        if in_bucket.any():
+            print(f"{lo:5.2f}-{min(hi, 1):5.2f} {in_bucket.sum():>6} {hits[in_bucket].sum():>6} {hits[in_bucket].mean():>7.1%}")
+
+    above = similarities >= args.threshold + args.margin
+    recall = float(hits[above].mean()) if above.any() else 1.0
+    false_positives = [
+        (c['kept']['document'], doc['document'])
+        for c in report['clusters'] for doc in c['removed']
+        if jaccard(shingles[c['kept']['document']], shingles[doc['document']]) < args.threshold - FALSE_POSITIVE_MARGIN
+    ]
+    print(f"Recall at J >= {args.threshold + args.margin:.2f}: {recall:.1%} of {int(above.sum())} pairs, "
+          f"{len(false_positives)} removed below J {args.threshold - FALSE_POSITIVE_MARGIN:.2f}")
+    if false_positives:
+        print(json.dumps(false_positives[:10]))
+    sys.exit(0 if recall >= MIN_RECALL and not false_positives else 1)
+
+if __name__ == '__main__':
+    main()
@@ -3,20 +3,70 @@
 # --- App
 TITLE = "IncunabuLM"
 API_URL = "http://host.docker.internal:8000/generate"
+STREAM_API_URL = "http://host.docker.internal:8000/generate/stream"
 CSS = "utilis/style.css"
 IMAGE_PATH = 'utilis/scribe.png'
 
 TOKENIZER_PATH = "tokenizer/bpe_tokenizer.json"
 MODEL_PATH = "models/incunabulm_111m_poems_v2.pth"
 
+# --- INT8 inference (CPU only), see `python -m src.quantize`
+QUANTIZE = False
+QUANTIZED_MODEL_PATH = "models/incunabulm_111m_poems_v2_int8.pth"
+
+# --- API server
+HOST = "0.0.0.0"
+PORT = 8000
+WORKERS = 1  # > 1 forks CPU workers sharing one copy of the weights, see src/serve.py
+WORKER_THREADS = None  # torch threads per worker, default: available CPUs / WORKERS
+
+# --- Inference scheduler
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 10
+PREFIX_CACHE_MB = 256  # 0 disables reuse of prompt key/value states
+PREFIX_CACHE_BLOCK = 16
+
+# --- Compiled inference graphs, see `python -m src.compiled`
+COMPILE_INFERENCE = False
+COMPILE_MODE = None  # torch.compile mode, e.g. "max-autotune"
+COMPILE_BATCH_BUCKETS = (1, 2, 4, 8)
+COMPILE_CACHE_DIR = "compile_cache"
+
+# --- Response cache of deterministic /generate requests (seeded or top_k=1)
+RESPONSE_CACHE = None  # None, "memory" (per worker) or "disk" (shared by workers)
+RESPONSE_CACHE_SIZE = 1024  # entries
+RESPONSE_CACHE_TTL_S = 3600
+RESPONSE_CACHE_DIR = "cache/responses"
+
+# --- Stopping: end at the first sentence end after this fraction of max_tokens (None: only EOS, stop strings, max_tokens)
+SENTENCE_STOP_FRACTION = 0.8
+
+# --- Instrumentation
+PROFILE_BLOCKS = False  # per-Block forward timings in /metrics, synchronizes CUDA after every layer
+PROFILE_ENDPOINT = False  # enables POST /profile
+PROFILE_DIR = "profiles"
+
 # --- Training params
+DATA_DIR = "data/tokens"
+CHECKPOINT_DIR = "checkpoints"
+VAL_FRACTION = 0.1
+SEED = 1337
+COMPILE = True
+LOG_INTERVAL = 10
+CHECKPOINT_INTERVAL = 500
+LOADER_WORKERS = 2
+PREFETCH_BATCHES = 4
 BATCH_SIZE = 8
 BLOCK_SIZE = 2048
 EVAL_INTERVAL = 250
 EVAL_ITERS = 200
+EVAL_MODE = "fixed"  # "random", "fixed" or "process"
+EVAL_WINDOWS = 256
+EVAL_DEVICE = "cpu"
 WEIGHT_DECAY = 0.1
 CLIP_GRAD_NORM = 1.0
 ACCUMULATION_STEPS = 8
+PACKED_SEQUENCES = False  # fill rows with whole documents, attention and positions restart at each one
 
 # --- Learning rate scheduler
 MIN_LEARNING_RATE = 3e-5
@@ -30,6 +80,15 @@ N_HEAD = 12
 N_LAYER = 12
 DROPOUT = 0.2
 
+# --- Draft model for speculative decoding, trained with `python -m src.distill`
+DRAFT_MODEL_PATH = "models/incunabulm_draft.pth"
+DRAFT_N_EMBD = 256
+DRAFT_N_HEAD = 4
+DRAFT_N_LAYER = 4
+NUM_DRAFT_TOKENS = 4
+DISTILL_TEMPERATURE = 2.0
+DISTILL_ALPHA = 0.5  # weight of the teacher KL term, the rest is next-token cross-entropy
+
 # --- Tokenizer params
 VOCAB_SIZE = 16384
 
@@ -1,14 +1,33 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, model_validator
 import config
 import torch
 from tokenizers import Tokenizer
+from src.checkpoint import build_model_lazy
+from src.compiled import CompiledDecoder
+from src.metrics import BlockTimer, ServerMetrics
 from src.model import TransformerDecoder
+from src.prefix_cache import PrefixCache
+from src.quantize import load_quantized_model, quantize_model
+from src.response_cache import DiskBackend, MemoryBackend, ResponseCache, checkpoint_fingerprint
+from src.scheduler import BatchScheduler
+from src.serve import PreforkServer
+from src.speculative import load_draft_model, speculative_generate
+from src.stopping import StoppingCriteria, eos_token_ids
+from src.streaming import trim_to_sentence_end
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import json
 import logging
+import os
+import time
 import uvicorn
 import sys
 
-DEVICE = torch.device('cuda' if torch.cuda.is_available() else torch.float16)
+# INT8 dynamic quantization only has CPU kernels
+DEVICE = torch.device('cuda' if torch.cuda.is_available() and not config.QUANTIZE else 'cpu')
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,101 +37,461 @@ logging.basicConfig(
 logger = logging.getLogger("IncunabuLM")
 
 class ModelInput(BaseModel):
-    context: str = Field(..., min_length=1, description="Tekst wejściowy dla modelu językowego.")
+    context: Optional[str] = Field(default=None, min_length=1, description="Tekst wejściowy dla modelu językowego.")
+    prompts: Optional[List[str]] = Field(default=None, min_length=1, max_length=8, description="Kilka tekstów wejściowych naraz, zamiast context.")
+    num_samples: int = Field(default=1, ge=1, le=8, description="Liczba wersji generowanych dla każdego tekstu wejściowego.")
+    seed: Optional[int] = Field(default=None, ge=0, description="Ziarno losowania; wersja i dostaje ziarno seed + i.")
     max_tokens: int = Field(default=150, gt=0, le=1024, description="Maksymalna liczba tokenów do wygenerowania.")
     temperature: float = Field(default=1.0, gt=0.0, le=2.0)
     top_k: int = Field(default=50, gt=0)
     repetition_penalty: float = Field(default=1.0, gt=0.0)
+    top_p: float = Field(default=1.0, gt=0.0, le=1.0, description="Próbkowanie jądrowe: najmniejszy zbiór tokenów o łącznym prawdopodobieństwie top_p.")
+    min_p: float = Field(default=0.0, ge=0.0, le=1.0, description="Odrzuca tokeny mniej prawdopodobne niż min_p * prawdopodobieństwo najlepszego tokenu.")
+    frequency_penalty: float = Field(default=0.0, ge=-2.0, le=2.0)
+    presence_penalty: float = Field(default=0.0, ge=-2.0, le=2.0)
+    speculative: bool = Field(default=False, description="Dekodowanie spekulatywne z modelem szkicowym (wymaga DRAFT_MODEL_PATH).")
+    stop: Optional[List[str]] = Field(default=None, max_length=4, description="Ciągi znaków kończące generowanie (nie trafiają do wyniku).")
+    sentence_end_after: Optional[int] = Field(default=None, ge=0, description="Kończy na pierwszym końcu zdania po tylu tokenach; domyślnie SENTENCE_STOP_FRACTION * max_tokens.")
+
+    @model_validator(mode='after')
+    def check_prompts(self):
+        if (self.context is None) == (self.prompts is None):
+            raise ValueError("Exactly one of context and prompts must be given")
+        if self.prompts is not None and any(not p for p in self.prompts):
+            raise ValueError("Prompts must not be empty")
+        return self
+
+    @property
+    def contexts(self):
+        return self.prompts if self.prompts is not None else [self.context]
+
+    @property
+    def single(self):
+        return self.prompts is None and self.num_samples == 1
+
+    @property
+    def deterministic(self):
+        """Greedy requests, and seeded ones outside speculative decoding (whose rounds ignore the seed)."""
+        return self.top_k == 1 or (self.seed is not None and not self.speculative)
 
 class ModelOutput(BaseModel):
     response: str
+    samples: List[str] = Field(default_factory=list, description="Wszystkie wersje, kolejno dla każdego tekstu wejściowego.")
+    stop_reasons: List[Optional[str]] = Field(default_factory=list, description="Powód zakończenia każdej wersji: eos, stop_string, sentence_end lub null (limit tokenów).")
+    speculative: Optional[dict] = None
+
+metrics = ServerMetrics()
 
 def load_model_components():
     try:
+        timings = {}
+        t0 = time.perf_counter()
         logger.info("Loading tokenizer...")
         tokenizer = Tokenizer.from_file(config.TOKENIZER_PATH)
-        
-        logger.info("Initializing model...")
-        model = TransformerDecoder(
-            config.VOCAB_SIZE, 
-            config.N_EMBD, 
-            config.BLOCK_SIZE, 
-            config.N_HEAD, 
-            config.N_LAYER, 
-            config.DROPOUT
-        )
-        
-        logger.info("Loading model weights...")
-        model.load_state_dict(torch.load(config.MODEL_PATH, map_location=DEVICE, weights_only=True))
+        timings['tokenizer'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        if config.QUANTIZE and os.path.exists(config.QUANTIZED_MODEL_PATH):
+            logger.info(f"Loading INT8 model weights from {config.QUANTIZED_MODEL_PATH}...")
+            with torch.device('meta'):
+                model = TransformerDecoder(
+                    config.VOCAB_SIZE,
+                    config.N_EMBD,
+                    config.BLOCK_SIZE,
+                    config.N_HEAD,
+                    config.N_LAYER,
+                    config.DROPOUT
+                )
+            total_params = sum(p.numel() for p in model.parameters())
+            # Quantization needs real (if uninitialized) fp32 storage to pack
+            model = load_quantized_model(config.QUANTIZED_MODEL_PATH, model.to_empty(device='cpu'))
+        else:
+            logger.info(f"Mapping model weights from {config.MODEL_PATH}...")
+            model = build_model_lazy(config, config.MODEL_PATH)
+            total_params = sum(p.numel() for p in model.parameters())
+            if config.QUANTIZE:
+                logger.info("No quantized checkpoint found, quantizing to INT8...")
+                model = quantize_model(model)
+        timings['weights'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
         model.to(DEVICE)
         model.eval()
-        
-        total_params = sum(p.numel() for p in model.parameters())
+        timings['to_device'] = time.perf_counter() - t0
+
+        for stage, seconds in timings.items():
+            metrics.startup_seconds.set(seconds, stage=stage)
         logger.info(f"Model {config.MODEL_PATH.split('/')[-1]} loaded successfully.  Parameters: {total_params:,}")
-        
+        logger.info("Startup timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+
         return tokenizer, model, total_params
         
     except Exception as e:
         logger.error(f"Failed to load model components: {e}")
         raise RuntimeError(f"Model initialization failed: {e}")
 
-tokenizer, model, total_params = load_model_components()
+def load_draft_components():
+    if not os.path.exists(config.DRAFT_MODEL_PATH):
+        return None
+    logger.info(f"Loading draft model from {config.DRAFT_MODEL_PATH}...")
+    return load_draft_model(config.DRAFT_MODEL_PATH, DEVICE)
+
+def load_all_components():
+    tokenizer, model, total_params = load_model_components()
+    return tokenizer, model, total_params, load_draft_components()
+
+def load_response_cache():
+    if config.RESPONSE_CACHE is None:
+        return None
+    if config.RESPONSE_CACHE == 'memory':
+        backend = MemoryBackend(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL_S)
+    elif config.RESPONSE_CACHE == 'disk':
+        backend = DiskBackend(config.RESPONSE_CACHE_DIR, config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL_S)
+    else:
+        raise ValueError(f"Unknown RESPONSE_CACHE backend: {config.RESPONSE_CACHE}")
+    weights = [config.MODEL_PATH] + ([config.QUANTIZED_MODEL_PATH] if config.QUANTIZE else [])
+    fingerprint = checkpoint_fingerprint(*weights)
+    logger.info(f"Response cache ({config.RESPONSE_CACHE}) enabled for checkpoint {fingerprint}")
+    return ResponseCache(backend, fingerprint)
+
+def setup_components(app, tokenizer, model, total_params, draft_model=None):
+    """
+    Attach the model, tokenizer and batch scheduler to app.state. Called at
+    startup unless a model was attached beforehand (see benchmarks/bench_api.py),
+    or in every worker process after the fork in pre-fork mode.
+    """
+    prefix_cache = None
+    if config.PREFIX_CACHE_MB > 0:
+        prefix_cache = PrefixCache(config.PREFIX_CACHE_MB * 1024 * 1024, block_tokens=config.PREFIX_CACHE_BLOCK)
+
+    app.state.tokenizer = tokenizer
+    app.state.model = model
+    app.state.total_params = total_params
+    app.state.draft_model = draft_model
+    app.state.prefix_cache = prefix_cache
+    app.state.response_cache = load_response_cache()
+    inference_model = model
+    if config.COMPILE_INFERENCE:
+        inference_model = CompiledDecoder(
+            model,
+            batch_buckets=config.COMPILE_BATCH_BUCKETS,
+            cache_dir=config.COMPILE_CACHE_DIR,
+            mode=config.COMPILE_MODE
+        )
+        inference_model.warmup(next(model.parameters()).device)
+
+    app.state.scheduler = BatchScheduler(
+        inference_model,
+        pad_token_id=tokenizer.token_to_id('[PAD]'),
+        max_batch_size=config.MAX_BATCH_SIZE,
+        max_wait=config.MAX_BATCH_WAIT_MS / 1000,
+        device=next(model.parameters()).device,
+        prefix_cache=prefix_cache,
+        metrics=metrics
+    )
+    metrics.queue_depth.fn = lambda: app.state.scheduler.queue_depth
+    metrics.active_sequences.fn = lambda: app.state.scheduler.active_sequences
+    app.state.block_timer = BlockTimer(model, metrics.block_seconds) if config.PROFILE_BLOCKS else None
+    # Speculative requests run one at a time next to the batch scheduler
+    app.state.speculative_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if getattr(app.state, 'model', None) is None:
+        setup_components(app, *load_all_components())
+    app.state.scheduler.start()
+    yield
+    app.state.scheduler.stop()
+
+app = FastAPI(title=getattr(config, 'title', 'IncunabuLM API'), lifespan=lifespan)
+
+def encode_context(text):
+    tokenizer = app.state.tokenizer
+    bos_token_id = tokenizer.token_to_id('[BOS]')
+    if bos_token_id is None:
+        raise ValueError("BOS token not found in tokenizer vocabulary")
+    with metrics.time('tokenize'):
+        return [bos_token_id] + tokenizer.encode(text).ids
+
+def sampling_args(data: ModelInput):
+    return dict(
+        temperature=data.temperature,
+        top_k=data.top_k,
+        repetition_penalty=data.repetition_penalty,
+        top_p=data.top_p,
+        min_p=data.min_p,
+        frequency_penalty=data.frequency_penalty,
+        presence_penalty=data.presence_penalty
+    )
+
+def make_stopping(data: ModelInput, context):
+    sentence_end_after = data.sentence_end_after
+    if sentence_end_after is None and config.SENTENCE_STOP_FRACTION is not None:
+        sentence_end_after = int(config.SENTENCE_STOP_FRACTION * data.max_tokens)
+    return StoppingCriteria(
+        app.state.tokenizer,
+        context,
+        eos_token_ids=eos_token_ids(app.state.tokenizer),
+        stop_strings=data.stop or (),
+        sentence_end_after=sentence_end_after
+    )
+
+def final_text(data: ModelInput, prompt, context, stopping):
+    """
+    Prompt plus generated text. Sequences that ran into max_tokens are cut after
+    their last complete sentence; the others already ended where they stopped.
+    """
+    text = app.state.tokenizer.decode(context) + stopping.text + stopping.flush()
+    if stopping.reason is None:
+        return trim_to_sentence_end(text, len(prompt))
+    return text
+
+def submit_request(data: ModelInput, context, stopping=None, on_token=None):
+    return app.state.scheduler.submit(
+        context,
+        max_new_tokens=data.max_tokens,
+        seed=data.seed,
+        stopping=stopping,
+        **sampling_args(data),
+        on_token=on_token
+    )
 
-app = FastAPI(title=getattr(config, 'title', 'IncunabuLM API'))
+def submit_samples(data: ModelInput, contexts, stopping):
+    """num_samples futures per context, submitted together so each prompt is prefilled once."""
+    prompts = [context for context in contexts for _ in range(data.num_samples)]
+    seeds = [data.seed + i for i in range(len(prompts))] if data.seed is not None else None
+    return app.state.scheduler.submit_many(prompts, data.max_tokens, seeds=seeds, stopping=stopping, **sampling_args(data))
+
+def run_speculative(data: ModelInput, context):
+    model = app.state.model
+    with torch.inference_mode():
+        idx, stats = speculative_generate(
+            model,
+            app.state.draft_model,
+            torch.tensor([context], dtype=torch.long, device=next(model.parameters()).device),
+            max_new_tokens=min(data.max_tokens, model.block_size - 1),
+            num_draft_tokens=config.NUM_DRAFT_TOKENS,
+            **sampling_args(data)
+        )
+    logger.info(f"Speculative decoding: {stats.accepted}/{stats.proposed} draft tokens accepted "
+                f"({stats.acceptance_rate:.0%}) in {stats.rounds} rounds")
+    return idx[0, len(context):].tolist(), stats
 
 @app.post("/generate", response_model=ModelOutput)
 async def generate_text(data: ModelInput):
+    if data.speculative and app.state.draft_model is None:
+        raise HTTPException(status_code=400, detail=f"Speculative decoding needs a draft model at {config.DRAFT_MODEL_PATH}")
+    if data.speculative and not data.single:
+        raise HTTPException(status_code=400, detail="Speculative decoding supports a single prompt and sample")
+    t0 = time.perf_counter()
+    response_cache = app.state.response_cache
+    cache_key = None
+    if response_cache is not None:
+        if data.deterministic:
+            # The sentence stop default shapes the response as much as the request does
+            cache_key = response_cache.key({**data.model_dump(), 'sentence_stop_fraction': config.SENTENCE_STOP_FRACTION})
+            cached = await asyncio.to_thread(response_cache.get, cache_key)
+            metrics.response_cache.inc(result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                metrics.observe('request', time.perf_counter() - t0)
+                metrics.requests.inc(endpoint='generate', status='ok')
+                return ModelOutput(**cached)
+        else:
+            metrics.response_cache.inc(result='skip')
     try:
-        bos_token_id = tokenizer.token_to_id('[BOS]')
-        if bos_token_id is None:
-            raise ValueError("BOS token not found in tokenizer vocabulary")
-            
-        prompt_ids = tokenizer.encode(data.context).ids
-        context = torch.tensor([[bos_token_id] + prompt_ids], dtype=torch.long, device=DEVICE)
-
-        with torch.no_grad():
-            generated_ids = model.generate(
-                context, 
-                max_new_tokens=data.max_tokens,
-                temperature=data.temperature,
-                top_k=data.top_k,
-                repetition_penalty=data.repetition_penalty
-            )
-        
-        decoded_text = tokenizer.decode(generated_ids[0].tolist())
-        
-        punctuation_marks = ['.', '?', '!']
-        last_punc_indices = [decoded_text.rfind(p) for p in punctuation_marks]
-        last_punc_idx = max(idx for idx in last_punc_indices if idx != -1) if any(idx != -1 for idx in last_punc_indices) else -1
-        
-        if last_punc_idx != -1 and last_punc_idx >= len(data.context):
-            output = decoded_text[:last_punc_idx + 1]
+        contexts = [encode_context(text) for text in data.contexts]
+        prompts = [(text, context) for text, context in zip(data.contexts, contexts) for _ in range(data.num_samples)]
+        stopping = [make_stopping(data, context) for _, context in prompts]
+        stats = None
+        if data.speculative:
+            async with app.state.speculative_lock:
+                generated_ids, stats = await asyncio.to_thread(run_speculative, data, contexts[0])
+            # Speculative rounds cannot stop mid-round, the criteria are applied afterwards
+            for token_id in generated_ids:
+                if stopping[0].stopped:
+                    break
+                stopping[0].push(token_id)
         else:
-            output = decoded_text
+            futures = submit_samples(data, contexts, stopping)
+            try:
+                await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        with metrics.time('detokenize'):
+            samples = [final_text(data, text, context, s) for (text, context), s in zip(prompts, stopping)]
 
-        return ModelOutput(response=output)
+        output = ModelOutput(
+            response=samples[0],
+            samples=samples,
+            stop_reasons=[s.reason for s in stopping],
+            speculative=stats.as_dict() if stats is not None else None
+        )
+        if cache_key is not None:
+            await asyncio.to_thread(response_cache.set, cache_key, output.model_dump())
+        metrics.observe('request', time.perf_counter() - t0)
+        metrics.requests.inc(endpoint='generate', status='ok')
+        return output
         
     except Exception as e:
         logger.error(f"Text generation failed: {e}")
+        metrics.requests.inc(endpoint='generate', status='error')
+        raise HTTPException(status_code=500, detail=f"Text generation failed: {str(e)}")
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.post("/generate/stream")
+async def generate_text_stream(data: ModelInput):
+    """
+    Server-Sent Events version of /generate. Each event carries a "text" delta,
+    sent as soon as its tokens are decoded. The last event is {"done": true, "trim": n},
+    or {"error": ...} if generation failed: a sequence that ran into max_tokens is cut
+    after its last complete sentence like /generate does, which is only known at the
+    end, so the client drops the last n characters. The concatenated deltas without
+    them equal the /generate response.
+    """
+    if not data.single:
+        raise HTTPException(status_code=400, detail="Streaming supports a single prompt and sample, use /generate")
+    t0 = time.perf_counter()
+    try:
+        context = encode_context(data.context)
+    except Exception as e:
+        logger.error(f"Text generation failed: {e}")
+        metrics.requests.inc(endpoint='generate_stream', status='error')
         raise HTTPException(status_code=500, detail=f"Text generation failed: {str(e)}")
 
+    loop = asyncio.get_running_loop()
+    tokens = asyncio.Queue()
+    future = submit_request(data, context, stopping=make_stopping(data, context),
+                            on_token=lambda t: loop.call_soon_threadsafe(tokens.put_nowait, t))
+    future.add_done_callback(lambda f: loop.call_soon_threadsafe(tokens.put_nowait, None))
+
+    tokenizer = app.state.tokenizer
+
+    async def events():
+        # Same criteria as the scheduler's copy, replayed here to produce the text
+        stopping = make_stopping(data, context)
+        detokenize_seconds = 0.0
+        status = 'cancelled'
+        streamed = tokenizer.decode(context)
+        try:
+            yield sse_event({"text": streamed})
+            while (token_id := await tokens.get()) is not None:
+                d0 = time.perf_counter()
+                text = stopping.push(token_id)
+                detokenize_seconds += time.perf_counter() - d0
+                if text:
+                    streamed += text
+                    yield sse_event({"text": text})
+
+            if future.exception() is not None:
+                logger.error(f"Text generation failed: {future.exception()}")
+                status = 'error'
+                yield sse_event({"error": f"Text generation failed: {future.exception()}"})
+                return
+
+            text = stopping.flush()
+            if text:
+                streamed += text
+                yield sse_event({"text": text})
+            trim = 0
+            if stopping.reason is None:
+                trim = len(streamed) - len(trim_to_sentence_end(streamed, len(data.context)))
+            status = 'ok'
+            yield sse_event({"done": True, "trim": trim})
+        finally:
+            # Stop decoding for clients that disconnected mid-stream
+            future.cancel()
+            metrics.observe('detokenize', detokenize_seconds)
+            metrics.observe('request', time.perf_counter() - t0)
+            metrics.requests.inc(endpoint='generate_stream', status=status)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.get("/")
 def root():
     return {
         "service": "IncunabuLM API",
         "status": "running",
         "model_name": f"{config.MODEL_PATH.split('/')[-1]}",
-        "model_parameters": f"{total_params:,}",
+        "model_parameters": f"{app.state.total_params:,}",
         "endpoints": {
             "generate": "/generate",
+            "generate_stream": "/generate/stream",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "model_loaded": True}
+    return {
+        "status": "healthy",
+        "model_loaded": True,
+        "draft_model_loaded": app.state.draft_model is not None,
+        "queue_depth": app.state.scheduler.queue_depth,
+        "active_sequences": app.state.scheduler.active_sequences,
+        "prefix_cache": app.state.prefix_cache.stats() if app.state.prefix_cache is not None else None,
+        "response_cache": app.state.response_cache.stats() if app.state.response_cache is not None else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def run_profiled(data: ModelInput, context, trace_path):
+    model = app.state.model
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    idx = torch.tensor([context], dtype=torch.long, device=next(model.parameters()).device)
+    with torch.inference_mode(), torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+        model.generate(
+            idx,
+            max_new_tokens=min(data.max_tokens, model.block_size - 1),
+            **sampling_args(data)
+        )
+    prof.export_chrome_trace(trace_path)
+    sort_by = 'cuda_time_total' if torch.cuda.is_available() else 'cpu_time_total'
+    return prof.key_averages().table(sort_by=sort_by, row_limit=25)
+
+@app.post("/profile")
+async def profile_request(data: ModelInput):
+    """
+    Run one request outside the batch scheduler under torch.profiler and save a
+    Chrome trace (open in chrome://tracing or Perfetto) to config.PROFILE_DIR.
+    Disabled unless config.PROFILE_ENDPOINT is set.
+    """
+    if not config.PROFILE_ENDPOINT:
+        raise HTTPException(status_code=404, detail="Profiling is disabled, set PROFILE_ENDPOINT in config.py")
+    if not data.single:
+        raise HTTPException(status_code=400, detail="Profiling supports a single prompt and sample")
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    trace_path = os.path.join(config.PROFILE_DIR, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    try:
+        context = encode_context(data.context)
+        # Shares the lock with speculative decoding so at most one request runs outside the scheduler
+        async with app.state.speculative_lock:
+            table = await asyncio.to_thread(run_profiled, data, context, trace_path)
+    except Exception as e:
+        logger.error(f"Profiling failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Profiling failed: {str(e)}")
+    logger.info(f"Profiler trace saved to {trace_path}")
+    return {"trace": trace_path, "summary": table}
 
 if __name__ == "__main__":
-    logger.info("Starting FastAPI server at http://0.0.0.0:8000")
-    uvicorn.run(app, host='0.0.0.0', port='8000')
\ No newline at end of file
+    if config.WORKERS > 1:
+        PreforkServer(
+            app,
+            load=load_all_components,
+            setup=setup_components,
+            host=config.HOST,
+            port=config.PORT,
+            num_workers=config.WORKERS,
+            threads_per_worker=config.WORKER_THREADS
+        ).run()
+    else:
+        logger.info(f"Starting FastAPI server at http://{config.HOST}:{config.PORT}")
+        uvicorn.run(app, host=config.HOST, port=config.PORT)
\ No newline at end of file
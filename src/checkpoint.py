@@ -0,0 +1,141 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import torch
+
+import config
+from src.model import TransformerDecoder, convert_legacy_state_dict
+
+logger = logging.getLogger("IncunabuLM")
+
+def _to_cpu(obj):
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+def atomic_save(obj, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class CheckpointWriter:
+    """
+    Saves checkpoints on a background thread so the training step is not stalled
+    by disk I/O. The state is copied to CPU on the caller's thread first, so
+    training can keep updating the live tensors while the copy is written.
+    """
+    def __init__(self):
+        self._thread = None
+        self._error = None
+
+    def save(self, state, path, on_saved=None):
+        self.wait()
+        snapshot = _to_cpu(state)
+        self._thread = threading.Thread(target=self._write, args=(snapshot, path, on_saved), daemon=True)
+        self._thread.start()
+
+    def _write(self, snapshot, path, on_saved):
+        try:
+            atomic_save(snapshot, path)
+            logger.info(f"Checkpoint saved to {path}")
+            if on_saved is not None:
+                on_saved(path)
+        except Exception as e:
+            self._error = e
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Saving checkpoint failed: {error}")
+
+def load_checkpoint_model(path, device='cpu', default_cfg=None):
+    """
+    Build a TransformerDecoder from a checkpoint. Full training checkpoints carry
+    their own config; plain state_dicts are built with the sizes in default_cfg,
+    config.py unless given. Returns (model, cfg, iteration).
+    """
+    state = torch.load(path, map_location='cpu', weights_only=False)
+    if 'model' in state:
+        cfg, state_dict, iteration = SimpleNamespace(**state['config']), state['model'], state.get('iter')
+    else:
+        cfg, state_dict, iteration = default_cfg or config, state, None
+
+    model = TransformerDecoder(cfg.VOCAB_SIZE, cfg.N_EMBD, cfg.BLOCK_SIZE, cfg.N_HEAD, cfg.N_LAYER, cfg.DROPOUT)
+    model.load_state_dict(convert_legacy_state_dict(state_dict))
+    model.to(device)
+    model.eval()
+    return model, cfg, iteration
+
+def load_state_dict_mmap(path):
+    """
+    Memory-map a state_dict saved with torch.save: tensors point into the page
+    cache and are read from disk on first use instead of being copied up front.
+    Files in the legacy (pre-zipfile) serialization format are loaded normally.
+    """
+    try:
+        return torch.load(path, map_location='cpu', weights_only=True, mmap=True)
+    except RuntimeError as e:
+        logger.warning(f"Cannot memory-map {path} ({e}), loading it into memory instead")
+        return torch.load(path, map_location='cpu', weights_only=True)
+
+def build_model_lazy(cfg, path):
+    """
+    TransformerDecoder with the sizes in cfg and the weights of the state_dict at
+    path, built without initializing parameters that are overwritten anyway: the
+    modules are created on the meta device and the memory-mapped tensors are
+    assigned to them as they are. Legacy per-head checkpoints are fused on the fly,
+    which copies the attention weights; convert them once with
+    `python -m src.checkpoint --convert` to avoid that.
+    """
+    with torch.device('meta'):
+        model = TransformerDecoder(cfg.VOCAB_SIZE, cfg.N_EMBD, cfg.BLOCK_SIZE, cfg.N_HEAD, cfg.N_LAYER, cfg.DROPOUT)
+    state_dict = convert_legacy_state_dict(load_state_dict_mmap(path))
+    model.load_state_dict(state_dict, assign=True)
+    return model.eval()
+
+def convert_checkpoint(input_path, output_path):
+    """Write the model weights of any checkpoint as a plain fused state_dict that build_model_lazy can map directly."""
+    state = torch.load(input_path, map_location='cpu', weights_only=False)
+    state_dict = convert_legacy_state_dict(state.get('model', state))
+    atomic_save({name: tensor.contiguous() for name, tensor in state_dict.items()}, output_path)
+    logger.info(f"Converted {input_path} -> {output_path} ({len(state_dict)} tensors)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpoint utilities.")
+    parser.add_argument('--convert', nargs=2, metavar=('INPUT', 'OUTPUT'),
+                        help="Rewrite a legacy or full training checkpoint as a memory-mappable fused state_dict")
+    parser.add_argument('--time-load', metavar='PATH', help="Measure how long build_model_lazy takes for PATH")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    if args.convert:
+        convert_checkpoint(*args.convert)
+    elif args.time_load:
+        t0 = time.perf_counter()
+        model = build_model_lazy(config, args.time_load)
+        logger.info(f"Built {sum(p.numel() for p in model.parameters()):,}-parameter model in {time.perf_counter() - t0:.3f}s")
+    else:
+        parser.error("either --convert or --time-load is required")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import bisect
+import logging
+import os
+import sys
+import time
+
+import torch
+import torch.nn as nn
+
+import config
+from src.model import LayerCache, TransformerDecoder, left_pad
+
+logger = logging.getLogger("IncunabuLM")
+
+def default_buckets(block_size, start=16):
+    buckets = []
+    n = start
+    while n < block_size:
+        buckets.append(n)
+        n *= 2
+    return tuple(buckets) + (block_size,)
+
+def enable_compile_cache(cache_dir):
+    """Keep Inductor's compiled kernels and FX graphs on disk so a restarted server does not recompile."""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.abspath(cache_dir))
+    torch._inductor.config.fx_graph_cache = True
+
+class _DecoderGraph(nn.Module):
+    """
+    TransformerDecoder.forward as a pure function of fixed-shape tensors: the past
+    keys/values come in as tensors and only the new ones go out, so torch.compile
+    sees no Python cache objects and can specialize one graph per shape.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, idx, position_ids, key_mask, past_k, past_v):
+        model = self.model
+        T = idx.size(1)
+        mask = model._attention_mask(key_mask, T)
+        x = model.token_embedding_table(idx) + model.position_embeddings_table(position_ids)
+        new_k, new_v = [], []
+        for i, block in enumerate(model.blocks):
+            cache = LayerCache()
+            if past_k:
+                cache.k, cache.v = past_k[i], past_v[i]
+            x = block(x, cache, mask)
+            new_k.append(cache.k[:, :, -T:])
+            new_v.append(cache.v[:, :, -T:])
+        logits = model.lm_head(model.RMSN_f(x))
+        return logits, new_k, new_v
+
+class CompiledDecoder:
+    """
+    torch.compile'd inference wrapper around a TransformerDecoder with the same
+    call signature as its forward (idx, kv_cache, position_ids, attention_mask),
+    used by BatchScheduler in place of the eager model.
+
+    Inputs are padded up to static shape buckets so a bounded set of graphs is
+    compiled: batch size to batch_buckets, new tokens (prefill; 1 for decode) and
+    cached tokens to length_buckets. Padding is added on the left of the batch,
+    cache and token dimensions and masked out, so the real rows and positions
+    compute exactly what the eager model does. Compiled kernels are cached on disk
+    in cache_dir.
+
+    Anything that does not fit a bucket, training mode, or a failure to compile
+    runs the eager model instead; a compile failure disables compilation for good.
+    Other attributes (generate, block_size, ...) are those of the eager model.
+    """
+    def __init__(self, model, batch_buckets=(1, 2, 4, 8), length_buckets=None, cache_dir=None, mode=None):
+        self.model = model
+        self.batch_buckets = tuple(sorted(batch_buckets))
+        self.length_buckets = tuple(sorted(length_buckets or default_buckets(model.block_size)))
+        if cache_dir is not None:
+            enable_compile_cache(cache_dir)
+        # One graph per (batch, new tokens, cached tokens) bucket
+        limit = len(self.batch_buckets) * len(self.length_buckets) * (len(self.length_buckets) + 1)
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, limit)
+        self._graph = torch.compile(_DecoderGraph(model), mode=mode, dynamic=False, fullgraph=True)
+        self.enabled = True
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def parameters(self):
+        return self.model.parameters()
+
+    def new_cache(self):
+        return self.model.new_cache()
+
+    def _bucket(self, buckets, n):
+        i = bisect.bisect_left(buckets, n)
+        return buckets[i] if i < len(buckets) else None
+
+    def __call__(self, idx, targets=None, kv_cache=None, position_ids=None, attention_mask=None):
+        if not self.enabled or targets is not None or kv_cache is None or self.model.training:
+            return self.model(idx, targets, kv_cache, position_ids, attention_mask)
+
+        B, T = idx.shape
+        S = len(kv_cache)
+        Bb = self._bucket(self.batch_buckets, B)
+        Tb = 1 if T == 1 else self._bucket(self.length_buckets, T)
+        Sb = 0 if S == 0 else self._bucket(self.length_buckets, S)
+        if Bb is None or Tb is None or Sb is None:
+            return self.model(idx, targets, kv_cache, position_ids, attention_mask)
+
+        if position_ids is None:
+            if S + T > self.model.block_size:
+                raise ValueError(f"Sequence length {S + T} exceeds block_size {self.model.block_size}")
+            position_ids = torch.arange(S, S + T, device=idx.device).expand(B, T)
+        position_ids = position_ids.expand(B, T)
+        new_mask = attention_mask if attention_mask is not None else torch.ones(B, T, dtype=torch.bool, device=idx.device)
+        past_mask = kv_cache.mask if kv_cache.mask is not None else torch.ones(B, S, dtype=torch.bool, device=idx.device)
+
+        key_mask = torch.cat((
+            left_pad(left_pad(past_mask, Sb, 1, False), Bb, 0, False),
+            left_pad(left_pad(new_mask, Tb, 1, False), Bb, 0, False),
+        ), dim=1)
+        padded_idx = left_pad(left_pad(idx, Tb, 1), Bb, 0)
+        padded_positions = left_pad(left_pad(position_ids, Tb, 1), Bb, 0)
+        past_k = [left_pad(left_pad(layer.k, Sb, 2), Bb, 0) for layer in kv_cache.layers] if S else []
+        past_v = [left_pad(left_pad(layer.v, Sb, 2), Bb, 0) for layer in kv_cache.layers] if S else []
+
+        try:
+            logits, new_k, new_v = self._graph(padded_idx, padded_positions, key_mask, past_k, past_v)
+        except Exception as e:
+            logger.warning(f"Compiled forward failed, falling back to the eager model: {e}")
+            self.enabled = False
+            return self.model(idx, targets, kv_cache, position_ids, attention_mask)
+
+        for layer, k, v in zip(kv_cache.layers, new_k, new_v):
+            layer.update(k[Bb - B:, :, Tb - T:], v[Bb - B:, :, Tb - T:])
+        if attention_mask is not None or kv_cache.mask is not None:
+            kv_cache.mask = torch.cat((past_mask, new_mask), dim=1)
+        kv_cache.length += T
+        return logits[Bb - B:, Tb - T:], None
+
+    def warmup(self, device='cpu'):
+        """Compile (or load from the disk cache) the decode graphs and the prefill graphs without a cached prefix."""
+        t0 = time.perf_counter()
+        with torch.inference_mode():
+            for B in self.batch_buckets:
+                for T in self.length_buckets:
+                    self(torch.zeros(B, T, dtype=torch.long, device=device), kv_cache=self.new_cache())
+                for S in self.length_buckets:
+                    # S - 1 cached tokens fall into bucket S and leave room for the decoded one
+                    cache = self.new_cache()
+                    self.model(torch.zeros(B, S - 1, dtype=torch.long, device=device), kv_cache=cache)
+                    self(torch.zeros(B, 1, dtype=torch.long, device=device), kv_cache=cache)
+                if not self.enabled:
+                    break
+        logger.info(f"Compiled decoder warm-up took {time.perf_counter() - t0:.1f}s"
+                    + ("" if self.enabled else " and failed, serving the eager model"))
+
+@torch.no_grad()
+def parity_check(model, compiled, prompt_tokens=37, decode_steps=8, batch_size=3, device='cpu', seed=0):
+    """
+    Largest absolute logit difference between the eager model and the compiled
+    wrapper for a left-padded batched prefill followed by cached decode steps.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    vocab_size = model.lm_head.out_features
+    lengths = [max(1, prompt_tokens - 5 * i) for i in range(batch_size)]
+    idx = torch.randint(0, vocab_size, (batch_size, prompt_tokens), generator=generator).to(device)
+    mask = torch.zeros(batch_size, prompt_tokens, dtype=torch.bool)
+    for i, n in enumerate(lengths):
+        mask[i, prompt_tokens - n:] = True
+    mask = mask.to(device)
+    position_ids = (mask.long().cumsum(dim=1) - 1).clamp(min=0)
+
+    eager_cache, compiled_cache = model.new_cache(), compiled.new_cache()
+    expected, _ = model(idx, kv_cache=eager_cache, position_ids=position_ids, attention_mask=mask)
+    actual, _ = compiled(idx, kv_cache=compiled_cache, position_ids=position_ids, attention_mask=mask)
+    # Padded query rows are never read, compare the real ones only
+    diff = (expected - actual).abs()[mask].max().item()
+
+    positions = torch.tensor(lengths, device=device)
+    token = expected[:, -1].argmax(dim=-1, keepdim=True)
+    for _ in range(decode_steps):
+        expected, _ = model(token, kv_cache=eager_cache, position_ids=positions.unsqueeze(1))
+        actual, _ = compiled(token, kv_cache=compiled_cache, position_ids=positions.unsqueeze(1))
+        diff = max(diff, (expected - actual).abs().max().item())
+        token = expected[:, -1].argmax(dim=-1, keepdim=True)
+        positions = positions + 1
+    return diff
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the inference graphs into the on-disk cache and check them against the eager model.")
+    parser.add_argument('--weights', default=None, help="Model weights (default: random weights with the config.py sizes)")
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--warmup', action='store_true', help="Compile every warm-up bucket into config.COMPILE_CACHE_DIR")
+    parser.add_argument('--tolerance', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    if args.weights:
+        from src.checkpoint import build_model_lazy
+        model = build_model_lazy(config, args.weights)
+    else:
+        model = TransformerDecoder(config.VOCAB_SIZE, config.N_EMBD, config.BLOCK_SIZE, config.N_HEAD, config.N_LAYER, 0.0)
+    model.to(args.device).eval()
+    compiled = CompiledDecoder(model, config.COMPILE_BATCH_BUCKETS, cache_dir=config.COMPILE_CACHE_DIR, mode=config.COMPILE_MODE)
+
+    if args.warmup:
+        compiled.warmup(args.device)
+    diff = parity_check(model, compiled, device=args.device)
+    ok = compiled.enabled and diff <= args.tolerance
+    logger.info(f"Max |eager - compiled| logit difference: {diff:.2e} (tolerance {args.tolerance:.0e}) -> {'OK' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
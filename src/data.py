@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+
+# Drawn documents that may fail to fit a packed row before it is closed; they start the next row
+PACK_ATTEMPTS = 8
+
+class TokenDataset:
+    """
+    Pre-tokenized corpus written by utilis/tokenize_corpus.py.
+
+    Shards are opened as read-only np.memmap views, so only the windows that are
+    actually sampled are paged in. The token stream is split into train/val the
+    same way as the notebook: the last val_fraction of tokens is the validation set.
+    """
+    def __init__(self, path, val_fraction=0.1):
+        self.path = path
+        with open(os.path.join(path, 'index.json'), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+
+        dtype = np.dtype(self.index['dtype'])
+        self.shards = [np.memmap(os.path.join(path, s['file']), dtype=dtype, mode='r') for s in self.index['shards']]
+        self.shard_starts = np.cumsum([0] + [len(s) for s in self.shards])
+        self.num_tokens = int(self.shard_starts[-1])
+
+        n = int((1 - val_fraction) * self.num_tokens)
+        self.splits = {'train': (0, n), 'val': (n, self.num_tokens)}
+        self._offsets = None
+        self._segments = {}
+
+    @property
+    def offsets(self):
+        """Start offset of every document in the token stream."""
+        if self._offsets is None:
+            self._offsets = np.memmap(os.path.join(self.path, self.index['offsets']), dtype=np.uint64, mode='r')
+        return self._offsets
+
+    def document_segments(self, split, block_size):
+        """
+        (starts, lengths) of the documents of a split for packing. A document is
+        its tokens with the <|endoftext|> before and after it, so its first token
+        and its end are both predicted as in the flat stream. Documents longer than
+        block_size + 1 tokens are cut into consecutive pieces of block_size targets.
+        """
+        key = (split, block_size)
+        if key not in self._segments:
+            start, end = self.splits[split]
+            offsets = np.asarray(self.offsets, dtype=np.int64)
+            ends = np.append(offsets[1:], self.num_tokens)
+            in_split = (offsets >= start) & (offsets < end)
+            doc_starts, doc_ends = offsets[in_split], np.minimum(ends[in_split], end)
+            doc_starts = np.where(doc_starts > start, doc_starts - 1, doc_starts)
+
+            targets = doc_ends - doc_starts - 1
+            pieces = np.maximum(-(-targets // block_size), 0)
+            first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+            piece = np.arange(int(pieces.sum())) - first
+            starts = np.repeat(doc_starts, pieces) + piece * block_size
+            lengths = np.minimum(np.repeat(doc_ends, pieces) - starts, block_size + 1)
+            self._segments[key] = (starts, lengths)
+        return self._segments[key]
+
+    def read(self, start, length):
+        """Copy length tokens starting at start into an int64 array, crossing shard boundaries if needed."""
+        out = np.empty(length, dtype=np.int64)
+        shard = int(np.searchsorted(self.shard_starts, start, side='right')) - 1
+        pos, filled = start, 0
+        while filled < length:
+            local = pos - int(self.shard_starts[shard])
+            n = min(length - filled, len(self.shards[shard]) - local)
+            out[filled:filled + n] = self.shards[shard][local:local + n]
+            filled += n
+            pos += n
+            shard += 1
+        return out
+
+    def sample_starts(self, split, batch_size, block_size, rng):
+        start, end = self.splits[split]
+        return rng.integers(start, end - block_size, size=batch_size)
+
+    def eval_starts(self, split, block_size, max_windows=None):
+        """
+        Start offsets of consecutive, non-overlapping windows covering the split.
+        With max_windows, an evenly spaced subset is used instead of all of them.
+        """
+        start, end = self.splits[split]
+        starts = np.arange(start, end - block_size, block_size)
+        if max_windows is not None and len(starts) > max_windows:
+            starts = starts[np.linspace(0, len(starts) - 1, max_windows).round().astype(np.int64)]
+        return starts
+
+    def make_batch(self, starts, block_size):
+        """(x, y) CPU tensors for windows beginning at starts, y shifted by one token."""
+        rows = np.stack([self.read(int(i), block_size + 1) for i in starts])
+        x = torch.from_numpy(np.ascontiguousarray(rows[:, :-1]))
+        y = torch.from_numpy(np.ascontiguousarray(rows[:, 1:]))
+        return x, y
+
+    def make_packed_batch(self, split, batch_size, block_size, rng):
+        """
+        (x, y, position_ids, document_ids) CPU tensors whose rows are filled with
+        whole random documents of a split instead of one window of the stream.
+        Positions restart at 0 with every document and document_ids number the
+        documents of a row, so the model can keep attention inside each of them
+        (see TransformerDecoder.forward). The unfilled end of a row has targets -1,
+        which the loss ignores.
+
+        A drawn document that does not fit the rest of its row is set aside for the
+        next row, so long documents are not crowded out by short ones.
+        """
+        starts, lengths = self.document_segments(split, block_size)
+        x = np.zeros((batch_size, block_size), dtype=np.int64)
+        y = np.full((batch_size, block_size), -1, dtype=np.int64)
+        position_ids = np.zeros((batch_size, block_size), dtype=np.int64)
+        document_ids = np.full((batch_size, block_size), -1, dtype=np.int64)
+
+        pending = []
+        for row in range(batch_size):
+            filled, documents, misses = 0, 0, 0
+            candidates, pending = pending, []
+            while filled < block_size and misses < PACK_ATTEMPTS:
+                i = candidates.pop(0) if candidates else int(rng.integers(len(starts)))
+                n = int(lengths[i]) - 1
+                if n > block_size - filled:
+                    pending.append(i)
+                    misses += 1
+                    continue
+                tokens = self.read(int(starts[i]), n + 1)
+                x[row, filled:filled + n] = tokens[:-1]
+                y[row, filled:filled + n] = tokens[1:]
+                position_ids[row, filled:filled + n] = np.arange(n)
+                document_ids[row, filled:filled + n] = documents
+                filled += n
+                documents += 1
+            pending += candidates
+
+        return tuple(torch.from_numpy(a) for a in (x, y, position_ids, document_ids))
+
+    def get_batch(self, split, batch_size, block_size, device='cpu', rng=None):
+        """Random (x, y) windows of block_size tokens, y shifted by one, as in the notebook's get_batch."""
+        rng = rng if rng is not None else np.random.default_rng()
+        x, y = self.make_batch(self.sample_starts(split, batch_size, block_size, rng), block_size)
+        return x.to(device), y.to(device)
+
+SPLIT_IDS = {'train': 0, 'val': 1}
+
+class BatchPrefetcher:
+    """
+    Iterator over random batches of one split, assembled ahead of time on worker threads.
+    Batches are (x, y) windows of the token stream, or with packed=True the
+    (x, y, position_ids, document_ids) rows of TokenDataset.make_packed_batch.
+
+    Batch i is sampled with an RNG seeded from (seed, split, i), so the batch
+    stream does not depend on the number of workers and can be restarted at any
+    index (see the index attribute). Worker w builds batches w, w + n, w + 2n, ...
+    into its own queue and the consumer reads the queues round-robin. On CUDA the
+    batches are placed in pinned memory and copied to the device asynchronously.
+
+    wait_time accumulates how long the consumer blocked on an empty queue; if it is
+    a noticeable share of the step time, training is input-bound. utilization in
+    stats() is the share of positions with a target, below 1 only for packed rows.
+    """
+    def __init__(self, dataset, split, batch_size, block_size, device='cpu', num_workers=2,
+                 prefetch=2, seed=0, start=0, pin_memory=None, packed=False):
+        self.dataset = dataset
+        self.split = split
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.packed = packed
+        self.device = device
+        self.num_workers = max(1, num_workers)
+        self.seed = seed
+        self.start = start
+        self.index = start
+        self.pin_memory = str(device).startswith('cuda') if pin_memory is None else pin_memory
+
+        self.wait_time = 0.0
+        self.batches = 0
+        self.target_tokens = 0
+
+        self._stop = threading.Event()
+        self._queues = [queue.Queue(maxsize=prefetch) for _ in range(self.num_workers)]
+        self._threads = [
+            threading.Thread(target=self._worker, args=(w,), name=f"prefetch-{split}-{w}", daemon=True)
+            for w in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def build_batch(self, i):
+        rng = np.random.default_rng([self.seed, SPLIT_IDS[self.split], i])
+        if self.packed:
+            batch = self.dataset.make_packed_batch(self.split, self.batch_size, self.block_size, rng)
+        else:
+            starts = self.dataset.sample_starts(self.split, self.batch_size, self.block_size, rng)
+            batch = self.dataset.make_batch(starts, self.block_size)
+        if self.pin_memory:
+            batch = tuple(t.pin_memory() for t in batch)
+        return batch
+
+    def _worker(self, w):
+        i = self.start + w
+        q = self._queues[w]
+        while not self._stop.is_set():
+            try:
+                item = self.build_batch(i)
+            except Exception as e:
+                item = e
+            while not self._stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if isinstance(item, Exception):
+                return
+            i += self.num_workers
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        q = self._queues[(self.index - self.start) % self.num_workers]
+        t0 = time.perf_counter()
+        item = q.get()
+        self.wait_time += time.perf_counter() - t0
+        self.batches += 1
+        self.index += 1
+        if isinstance(item, Exception):
+            raise item
+        self.target_tokens += int((item[1] != -1).sum())
+        return tuple(t.to(self.device, non_blocking=self.pin_memory) for t in item)
+
+    def stats(self, reset=True):
+        stats = {
+            'batches': self.batches,
+            'wait_time': self.wait_time,
+            'mean_wait_ms': 1000 * self.wait_time / max(self.batches, 1),
+            'utilization': self.target_tokens / max(self.batches * self.batch_size * self.block_size, 1),
+        }
+        if reset:
+            self.wait_time, self.batches, self.target_tokens = 0.0, 0, 0
+        return stats
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,81 @@
+import argparse
+import logging
+import sys
+
+import torch
+from torch.nn import functional as F
+
+import config
+from src.checkpoint import load_checkpoint_model
+from src.speculative import draft_overrides
+from src.train import Trainer, load_config, parse_overrides
+
+logger = logging.getLogger("IncunabuLM")
+
+class DistillationTrainer(Trainer):
+    """
+    Trains the small draft model used by speculative decoding on the regular
+    corpus, matching the softened next-token distribution of the full model.
+
+    The loss is DISTILL_ALPHA * T^2 * KL(teacher || student) at temperature
+    T = DISTILL_TEMPERATURE plus (1 - DISTILL_ALPHA) * cross-entropy on the
+    corpus tokens. Everything else (checkpoints, resume, evaluation) is the
+    regular Trainer; the draft sizes are stored in the checkpoint config.
+    """
+    def __init__(self, cfg=None, teacher_path=None, **kwargs):
+        super().__init__(cfg or load_config(draft_overrides()), **kwargs)
+        self.teacher, _, _ = load_checkpoint_model(teacher_path or config.MODEL_PATH, self.device)
+        self.teacher.requires_grad_(False)
+        logger.info(f"Distilling {sum(p.numel() for p in self.teacher.parameters()):,}-parameter teacher into "
+                    f"{sum(p.numel() for p in self.model.parameters()):,}-parameter draft model")
+
+    def compute_loss(self, xb, yb, **kwargs):
+        logits, _ = self.compiled_model(xb, **kwargs)
+        with torch.no_grad():
+            teacher_logits, _ = self.teacher(xb, **kwargs)
+
+        T = self.cfg.DISTILL_TEMPERATURE
+        vocab_size = logits.size(-1)
+        # Padding at the end of packed rows has no target and takes no part in either term
+        valid = yb.view(-1) != -1
+        kl = F.kl_div(
+            F.log_softmax(logits.view(-1, vocab_size)[valid] / T, dim=-1),
+            F.log_softmax(teacher_logits.view(-1, vocab_size)[valid] / T, dim=-1),
+            reduction='batchmean',
+            log_target=True
+        ) * T * T
+        ce = F.cross_entropy(logits.view(-1, vocab_size), yb.view(-1), ignore_index=-1)
+        return self.cfg.DISTILL_ALPHA * kl + (1 - self.cfg.DISTILL_ALPHA) * ce
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill a draft model for speculative decoding.")
+    parser.add_argument('--teacher', default=config.MODEL_PATH, help="Weights of the full model (default: config.MODEL_PATH)")
+    parser.add_argument('--data-dir', help="Directory written by utilis/tokenize_corpus.py (default: config.DATA_DIR)")
+    parser.add_argument('--out-dir', default='checkpoints/draft')
+    parser.add_argument('--resume', action='store_true', help="Continue from <out-dir>/last.pth")
+    parser.add_argument('--device')
+    parser.add_argument('--set', nargs='*', metavar='NAME=VALUE', help="Override config.py values, e.g. DRAFT_N_LAYER=6")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    overrides = parse_overrides(args.set)
+    overrides.update({name: overrides.get(f'DRAFT_{name}', value) for name, value in draft_overrides().items()})
+    trainer = DistillationTrainer(
+        load_config(overrides),
+        teacher_path=args.teacher,
+        data_dir=args.data_dir,
+        out_dir=args.out_dir,
+        device=args.device
+    )
+    if args.resume:
+        trainer.resume()
+    trainer.train()
+    logger.info(f"Copy {trainer.best_model_path} to {config.DRAFT_MODEL_PATH} to use it for speculative decoding")
+
+if __name__ == '__main__':
+    main()
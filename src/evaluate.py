@@ -0,0 +1,184 @@
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+import torch
+
+import config
+from src.checkpoint import atomic_save, load_checkpoint_model
+from src.data import TokenDataset
+
+logger = logging.getLogger("IncunabuLM")
+
+@torch.no_grad()
+def _evaluate_batches(model, batches, device='cpu', ctx=None):
+    was_training = model.training
+    model.eval()
+
+    total_loss, total_tokens, windows = 0.0, 0, 0
+    t0 = time.perf_counter()
+    for x, y in batches:
+        x, y = x.to(device), y.to(device)
+        with ctx or nullcontext():
+            _, loss = model(x, y)
+        total_loss += loss.item() * y.numel()
+        total_tokens += y.numel()
+        windows += y.size(0)
+    seconds = time.perf_counter() - t0
+
+    model.train(was_training)
+    mean_loss = total_loss / max(total_tokens, 1)
+    return {
+        'loss': mean_loss,
+        'perplexity': math.exp(mean_loss),
+        'windows': windows,
+        'tokens': total_tokens,
+        'seconds': seconds,
+        'tokens_per_sec': total_tokens / seconds if seconds > 0 else 0.0,
+    }
+
+def evaluate_model(model, dataset, split, block_size, batch_size, device='cpu', max_windows=None, ctx=None):
+    """
+    Token-level loss and perplexity of model on the fixed evaluation windows of a
+    split. The windows never change for a given dataset, so evaluating the same
+    weights twice gives the same numbers.
+    """
+    starts = dataset.eval_starts(split, block_size, max_windows)
+    batches = (dataset.make_batch(starts[i:i + batch_size], block_size) for i in range(0, len(starts), batch_size))
+    return {'split': split, **_evaluate_batches(model, batches, device, ctx)}
+
+def evaluate_tokens(model, tokens, block_size, batch_size, device='cpu', max_windows=None, ctx=None):
+    """Same as evaluate_model for an in-memory 1-D tensor of token ids, e.g. a small text file."""
+    n = (len(tokens) - 1) // block_size
+    if max_windows is not None:
+        n = min(n, max_windows)
+    if n == 0:
+        raise ValueError(f"Need more than {block_size} tokens to evaluate, got {len(tokens)}")
+    x = tokens[:n * block_size].view(n, block_size)
+    y = tokens[1:n * block_size + 1].view(n, block_size)
+    batches = ((x[i:i + batch_size], y[i:i + batch_size]) for i in range(0, n, batch_size))
+    return _evaluate_batches(model, batches, device, ctx)
+
+def _best_logged_loss(log_path):
+    best = float('inf')
+    if os.path.exists(log_path):
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                best = min(best, json.loads(line)['val']['loss'])
+    return best
+
+def run_checkpoint_evaluation(checkpoint_path, data_dir, device='cpu', out_dir=None, max_windows=None):
+    """
+    Evaluate a checkpoint on the validation windows and append the result to
+    <out_dir>/eval.jsonl. A new lowest validation loss also saves the weights
+    to <out_dir>/best_model.pth. Meant to run in a process of its own.
+    """
+    torch.set_grad_enabled(False)
+    model, cfg, iteration = load_checkpoint_model(checkpoint_path, device)
+    dataset = TokenDataset(data_dir, val_fraction=cfg.VAL_FRACTION)
+    result = {
+        'iter': iteration,
+        'checkpoint': checkpoint_path,
+        'val': evaluate_model(model, dataset, 'val', cfg.BLOCK_SIZE, cfg.BATCH_SIZE, device,
+                              max_windows or getattr(cfg, 'EVAL_WINDOWS', None)),
+    }
+
+    out_dir = out_dir or os.path.dirname(checkpoint_path)
+    log_path = os.path.join(out_dir, 'eval.jsonl')
+    if result['val']['loss'] < _best_logged_loss(log_path):
+        atomic_save(model.state_dict(), os.path.join(out_dir, 'best_model.pth'))
+        result['best'] = True
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+
+    logger.info(f"Evaluated {checkpoint_path} (iter {iteration}): val loss {result['val']['loss']:.4f}, "
+                f"ppl {result['val']['perplexity']:.2f}, {result['val']['tokens_per_sec']:.0f} tokens/s")
+    return result
+
+def _evaluation_process(*args):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    run_checkpoint_evaluation(*args)
+
+class AsyncEvaluator:
+    """
+    Runs run_checkpoint_evaluation in a separate process so training continues
+    while a checkpoint is evaluated. If the previous evaluation is still running
+    the new checkpoint is skipped rather than queued.
+    """
+    def __init__(self, data_dir, device='cpu', out_dir=None, max_windows=None):
+        self.data_dir = data_dir
+        self.device = device
+        self.out_dir = out_dir
+        self.max_windows = max_windows
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+
+    @property
+    def busy(self):
+        return self._process is not None and self._process.is_alive()
+
+    def submit(self, checkpoint_path):
+        if self.busy:
+            logger.info(f"Evaluation still running, skipping {checkpoint_path}")
+            return False
+        self._process = self._context.Process(
+            target=_evaluation_process,
+            args=(checkpoint_path, self.data_dir, self.device, self.out_dir, self.max_windows),
+            daemon=True
+        )
+        self._process.start()
+        return True
+
+    def wait(self):
+        if self._process is not None:
+            self._process.join()
+            self._process = None
+
+def watch(checkpoint_dir, data_dir, device='cpu', interval=30.0, max_windows=None):
+    """Evaluate <checkpoint_dir>/last.pth every time it is replaced."""
+    path = os.path.join(checkpoint_dir, 'last.pth')
+    last_seen = None
+    while True:
+        if os.path.exists(path):
+            mtime = os.stat(path).st_mtime_ns
+            if mtime != last_seen:
+                last_seen = mtime
+                run_checkpoint_evaluation(path, data_dir, device, checkpoint_dir, max_windows)
+        time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate IncunabuLM checkpoints on fixed validation windows.")
+    parser.add_argument('--checkpoint', help="Evaluate this checkpoint once")
+    parser.add_argument('--watch', metavar='CHECKPOINT_DIR', help="Keep evaluating CHECKPOINT_DIR/last.pth as training updates it")
+    parser.add_argument('--data-dir', default=config.DATA_DIR)
+    parser.add_argument('--device', default=config.EVAL_DEVICE)
+    parser.add_argument('--max-windows', type=int, default=None)
+    parser.add_argument('--interval', type=float, default=30.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    if args.watch:
+        watch(args.watch, args.data_dir, args.device, args.interval, args.max_windows)
+    elif args.checkpoint:
+        result = run_checkpoint_evaluation(args.checkpoint, args.data_dir, args.device, max_windows=args.max_windows)
+        print(json.dumps(result, indent=2))
+    else:
+        parser.error("either --checkpoint or --watch is required")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+import torch
+
+# Latency buckets in seconds, from a single decode step up to a long generation
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.type = 'counter'
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Gauge:
+    """A value set directly, or read from fn when the metrics are rendered."""
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.type = 'gauge'
+        self.fn = fn
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[tuple(sorted(labels.items()))] = value
+
+    def samples(self):
+        if self.fn is not None:
+            value = self.fn()
+            return [] if value is None else [(self.name, (), value)]
+        return [(self.name, key, value) for key, value in list(self._values.items())]
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.type = 'histogram'
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._series.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f'{self.name}_bucket', key + (('le', _format_value(bound)),), count))
+                samples.append((f'{self.name}_sum', key, total))
+                samples.append((f'{self.name}_count', key, counts[-1]))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def process_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # No procfs (macOS): fall back to the peak, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class ServerMetrics:
+    """
+    Metrics of the inference server.
+
+    Request stages (tokenize, queue, prefill, decode, sample, detokenize and the
+    whole request) are timed into incunabulm_stage_seconds; prefill and decode are
+    measured per batch step, the others per request. Optional per-Block forward
+    timings are added by BlockTimer.
+    """
+    def __init__(self):
+        self.registry = Registry()
+        register = self.registry.register
+        self.stage_seconds = register(Histogram('incunabulm_stage_seconds', 'Time spent per request stage or batch step.'))
+        self.block_seconds = register(Histogram('incunabulm_block_forward_seconds', 'Forward time of each transformer Block.'))
+        self.requests = register(Counter('incunabulm_requests_total', 'Finished requests by endpoint and status.'))
+        self.tokens = register(Counter('incunabulm_generated_tokens_total', 'Tokens sampled by the model.'))
+        self.prompt_tokens = register(Counter('incunabulm_prompt_tokens_total', 'Prompt tokens prefilled, excluding reused prefix-cache tokens.'))
+        self.response_cache = register(Counter('incunabulm_response_cache_requests_total', 'Response cache lookups by result: hit, miss, or skip for non-deterministic requests.'))
+        self.decode_tokens_per_sec = register(Gauge('incunabulm_decode_tokens_per_second', 'Tokens per second of the latest batched decode step.'))
+        self.queue_depth = register(Gauge('incunabulm_queue_depth', 'Requests waiting to be admitted into the batch.'))
+        self.active_sequences = register(Gauge('incunabulm_active_sequences', 'Sequences currently being decoded.'))
+        self.startup_seconds = register(Gauge('incunabulm_startup_seconds', 'Time spent per model loading stage at startup.'))
+        self.rss = register(Gauge('incunabulm_process_resident_memory_bytes', 'Resident set size of the server process.', fn=process_rss_bytes))
+        if torch.cuda.is_available():
+            register(Gauge('incunabulm_cuda_memory_allocated_bytes', 'CUDA memory held by tensors.', fn=torch.cuda.memory_allocated))
+            register(Gauge('incunabulm_cuda_max_memory_allocated_bytes', 'Peak CUDA memory held by tensors.', fn=torch.cuda.max_memory_allocated))
+
+    def observe(self, stage, seconds):
+        self.stage_seconds.observe(seconds, stage=stage)
+
+    @contextmanager
+    def time(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def render(self):
+        return self.registry.render()
+
+class BlockTimer:
+    """
+    Forward-hook timing of every Block of a TransformerDecoder into a histogram
+    labelled by layer index. On CUDA each hook synchronizes the device so the
+    timings are real, which slows decoding down; keep it off unless investigating.
+    Start times are kept per thread, since the scheduler and speculative requests
+    run forwards of the same model concurrently.
+    """
+    def __init__(self, model, histogram):
+        self.histogram = histogram
+        self._starts = {}
+        self._handles = []
+        self._cuda = next(model.parameters()).is_cuda
+        for i, block in enumerate(model.blocks):
+            self._handles.append(block.register_forward_pre_hook(self._pre_hook(i)))
+            self._handles.append(block.register_forward_hook(self._hook(i)))
+
+    def _now(self):
+        if self._cuda:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def _pre_hook(self, layer):
+        def hook(module, args):
+            self._starts[threading.get_ident(), layer] = self._now()
+        return hook
+
+    def _hook(self, layer):
+        def hook(module, args, output):
+            # A forward already running when the hooks were installed has no start time
+            start = self._starts.pop((threading.get_ident(), layer), None)
+            if start is not None:
+                self.histogram.observe(self._now() - start, layer=layer)
+        return hook
+
+    def remove(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
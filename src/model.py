@@ -1,39 +1,135 @@
 import torch
 import torch.nn as nn
 from torch.nn import functional as F
+from src.sampling import build_logits_processors
 
-class Head(nn.Module):
-    def __init__(self, head_size, n_embd, block_size, dropout):
-        super().__init__()
-        self.key = nn.Linear(n_embd, head_size, bias=False)
-        self.query = nn.Linear(n_embd, head_size, bias=False)
-        self.value = nn.Linear(n_embd, head_size, bias=False)
-        self.register_buffer('tril', torch.tril(torch.ones(block_size, block_size)))
-        self.dropout = nn.Dropout(dropout)
+class LayerCache:
+    """Key/value tensors of one attention layer, shaped (B, n_head, S, head_size)."""
+    def __init__(self):
+        self.k = None
+        self.v = None
 
-    def forward(self, x):
-        B, T, C = x.shape
-        k = self.key(x)
-        q = self.query(x)
+    def update(self, k, v):
+        if self.k is not None:
+            k = torch.cat((self.k, k), dim=-2)
+            v = torch.cat((self.v, v), dim=-2)
+        self.k, self.v = k, v
+        return k, v
 
-        wei = q @ k.transpose(-2, -1) * k.size(-1)**-0.5
-        wei = wei.masked_fill(self.tril[:T, :T] == 0, float('-inf'))
-        wei = F.softmax(wei, dim=-1)
-        wei = self.dropout(wei)
+    def select(self, index):
+        self.k = self.k.index_select(0, index)
+        self.v = self.v.index_select(0, index)
 
-        v = self.value(x)
-        out = wei @ v
-        return out
+def left_pad(t, length, dim, value=0):
+    pad = length - t.size(dim)
+    if pad == 0:
+        return t
+    shape = list(t.shape)
+    shape[dim] = pad
+    return torch.cat((t.new_full(shape, value), t), dim=dim)
+
+class KVCache:
+    """
+    Per-layer key/value state used by TransformerDecoder for incremental decoding.
+
+    mask is None while every cached position is a real token. Batched decoding with
+    left-padded rows keeps a (B, S) boolean mask of the valid key positions instead.
+    """
+    def __init__(self, n_layer):
+        self.layers = [LayerCache() for _ in range(n_layer)]
+        self.length = 0
+        self.mask = None
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def batch_size(self):
+        return 0 if self.layers[0].k is None else self.layers[0].k.size(0)
+
+    def _full_mask(self):
+        if self.mask is not None:
+            return self.mask
+        k = self.layers[0].k
+        return torch.ones(k.size(0), self.length, dtype=torch.bool, device=k.device)
+
+    def select(self, index):
+        """Keep only the batch rows in index (a 1-D LongTensor)."""
+        for layer in self.layers:
+            layer.select(index)
+        self.mask = self._full_mask().index_select(0, index)
+
+    def extend(self, other):
+        """Append the rows of other, left-padding whichever cache is shorter."""
+        if self.batch_size == 0:
+            self.layers, self.length, self.mask = other.layers, other.length, other._full_mask()
+            return
+        length = max(self.length, other.length)
+        mask = torch.cat((left_pad(self._full_mask(), length, 1, False),
+                          left_pad(other._full_mask(), length, 1, False)), dim=0)
+        for layer, other_layer in zip(self.layers, other.layers):
+            layer.k = torch.cat((left_pad(layer.k, length, 2), left_pad(other_layer.k, length, 2)), dim=0)
+            layer.v = torch.cat((left_pad(layer.v, length, 2), left_pad(other_layer.v, length, 2)), dim=0)
+        self.length, self.mask = length, mask
+
+    def crop(self, length):
+        """Forget every position from length on, e.g. draft tokens rejected during speculative decoding."""
+        if length >= self.length:
+            return
+        for layer in self.layers:
+            layer.k = layer.k[:, :, :length]
+            layer.v = layer.v[:, :, :length]
+        if self.mask is not None:
+            self.mask = self.mask[:, :length]
+        self.length = length
+
+    def trim(self):
+        """Drop leading positions that are padding in every row. Returns how many were dropped."""
+        if self.mask is None or self.batch_size == 0:
+            return 0
+        valid = self.mask.any(dim=0)
+        drop = int(valid.long().argmax()) if bool(valid.any()) else self.length
+        if drop > 0:
+            for layer in self.layers:
+                layer.k = layer.k[:, :, drop:]
+                layer.v = layer.v[:, :, drop:]
+            self.mask = self.mask[:, drop:]
+            self.length -= drop
+        return drop
 
 class MultiHeadAttention(nn.Module):
     def __init__(self, num_heads, head_size, n_embd, dropout, block_size):
         super().__init__()
-        self.heads = nn.ModuleList([Head(head_size, n_embd, block_size, dropout) for _ in range(num_heads)])
+        self.num_heads = num_heads
+        self.head_size = head_size
+        self.qkv = nn.Linear(n_embd, 3 * head_size * num_heads, bias=False)
         self.proj = nn.Linear(head_size * num_heads, n_embd)
         self.dropout = nn.Dropout(dropout)
 
-    def forward(self, x):
-        out = torch.cat([h(x) for h in self.heads], dim=-1)
+    def forward(self, x, cache=None, mask=None):
+        B, T, C = x.shape
+        q, k, v = self.qkv(x).split(self.num_heads * self.head_size, dim=-1)
+        q = q.view(B, T, self.num_heads, self.head_size).transpose(1, 2)
+        k = k.view(B, T, self.num_heads, self.head_size).transpose(1, 2)
+        v = v.view(B, T, self.num_heads, self.head_size).transpose(1, 2)
+
+        if cache is not None:
+            k, v = cache.update(k, v)
+        S = k.size(-2)
+        dropout_p = self.dropout.p if self.training else 0.0
+
+        if mask is not None:
+            out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask, dropout_p=dropout_p)
+        elif S == T:
+            out = F.scaled_dot_product_attention(q, k, v, dropout_p=dropout_p, is_causal=True)
+        elif T == 1:
+            out = F.scaled_dot_product_attention(q, k, v, dropout_p=dropout_p)
+        else:
+            # Queries are the last T positions of the cached key sequence
+            mask = torch.ones(T, S, dtype=torch.bool, device=x.device).tril(diagonal=S - T)
+            out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask, dropout_p=dropout_p)
+
+        out = out.transpose(1, 2).contiguous().view(B, T, self.num_heads * self.head_size)
         out = self.proj(out)
         return out
 
@@ -73,8 +169,8 @@ class Block(nn.Module):
         self.RMSN1 = RMSNorm(n_embd)
         self.RMSN2 = RMSNorm(n_embd)
 
-    def forward(self, x):
-        x = x + self.sa(self.RMSN1(x))
+    def forward(self, x, cache=None, mask=None):
+        x = x + self.sa(self.RMSN1(x), cache, mask)
         x = x + self.ffwd(self.RMSN2(x))
         return x
 
@@ -88,12 +184,61 @@ class TransformerDecoder(nn.Module):
         self.RMSN_f = RMSNorm(n_embd)
         self.lm_head = nn.Linear(n_embd, vocab_size)
 
-    def forward(self, idx, targets=None):
+    def new_cache(self):
+        return KVCache(len(self.blocks))
+
+    @staticmethod
+    def _attention_mask(key_mask, T):
+        # Causal mask over the last T of S keys combined with the (B, S) padding mask.
+        # Every query may always see itself so padded rows never softmax over nothing.
+        S = key_mask.size(1)
+        causal = torch.ones(T, S, dtype=torch.bool, device=key_mask.device).tril(diagonal=S - T)
+        diagonal = F.pad(torch.eye(T, dtype=torch.bool, device=key_mask.device), (S - T, 0))
+        return ((causal & key_mask[:, None, :]) | diagonal).unsqueeze(1)
+
+    @staticmethod
+    def _document_mask(document_ids):
+        # Block-diagonal causal mask of packed rows: a query only sees earlier tokens of its own document
+        T = document_ids.size(1)
+        causal = torch.ones(T, T, dtype=torch.bool, device=document_ids.device).tril()
+        return (causal & (document_ids[:, :, None] == document_ids[:, None, :])).unsqueeze(1)
+
+    def forward(self, idx, targets=None, kv_cache=None, position_ids=None, attention_mask=None, document_ids=None):
+        """
+        Logits for idx and, with targets, the mean cross-entropy over every target
+        other than -1. document_ids (B, T) marks the documents packed into each row
+        (see TokenDataset.make_packed_batch): attention then stays inside a document,
+        and position_ids should restart at 0 with each of them.
+        """
         B, T = idx.shape
+        start = 0 if kv_cache is None else len(kv_cache)
+        if position_ids is None:
+            if start + T > self.block_size:
+                raise ValueError(f"Sequence length {start + T} exceeds block_size {self.block_size}")
+            position_ids = torch.arange(start, start + T, device=idx.device)
+
+        mask = None
+        if kv_cache is not None and (attention_mask is not None or kv_cache.mask is not None):
+            if attention_mask is None:
+                attention_mask = torch.ones(B, T, dtype=torch.bool, device=idx.device)
+            past = kv_cache.mask
+            if past is None:
+                past = torch.ones(B, start, dtype=torch.bool, device=idx.device)
+            kv_cache.mask = torch.cat((past, attention_mask), dim=1)
+            mask = self._attention_mask(kv_cache.mask, T)
+        elif attention_mask is not None:
+            mask = self._attention_mask(attention_mask, T)
+        elif document_ids is not None:
+            mask = self._document_mask(document_ids)
+
         tok_emb = self.token_embedding_table(idx)
-        pos_emb = self.position_embeddings_table(torch.arange(T, device=idx.device))
+        pos_emb = self.position_embeddings_table(position_ids)
         x = tok_emb + pos_emb
-        x = self.blocks(x)
+        caches = kv_cache.layers if kv_cache is not None else [None] * len(self.blocks)
+        for block, cache in zip(self.blocks, caches):
+            x = block(x, cache, mask)
+        if kv_cache is not None:
+            kv_cache.length += T
         x = self.RMSN_f(x)
         logits = self.lm_head(x)
 
@@ -103,34 +248,88 @@ class TransformerDecoder(nn.Module):
             B, T, C = logits.shape
             logits = logits.view(B*T, C)
             targets = targets.view(B*T)
-            loss = F.cross_entropy(logits, targets)
+            loss = F.cross_entropy(logits, targets, ignore_index=-1)
 
         return logits, loss
 
-    def generate(self, idx, max_new_tokens, temperature=1.0, top_k=None, repetition_penalty=1.2):
-        for _ in range(max_new_tokens):
+    def _next_logits(self, idx, kv_cache):
+        # With a cache only the tokens it has not seen yet go through the model.
+        # Past block_size the learned positions shift every step, so the cache is
+        # rebuilt from the last block_size tokens, same as the uncached window.
+        if kv_cache is None:
             idx_cond = idx if idx.size(1) <= self.block_size else idx[:, -self.block_size:]
             logits, _ = self(idx_cond)
-            logits = logits[:, -1, :]
+            return logits[:, -1, :], None
 
-            if repetition_penalty != 1.0:
-                for i in range(idx_cond.shape[0]):
-                    for token_id in set(idx_cond[i].tolist()):
-                        if logits[i, token_id] > 0:
-                            logits[i, token_id] /= repetition_penalty
-                        else:
-                            logits[i, token_id] *= repetition_penalty
+        if idx.size(1) > self.block_size:
+            kv_cache = self.new_cache()
+            logits, _ = self(idx[:, -self.block_size:], kv_cache=kv_cache)
+        else:
+            logits, _ = self(idx[:, len(kv_cache):], kv_cache=kv_cache)
+        return logits[:, -1, :], kv_cache
 
-            if temperature != 1.0:
-                logits = logits / temperature
+    def generate(self, idx, max_new_tokens, temperature=1.0, top_k=None, repetition_penalty=1.2,
+                 top_p=1.0, min_p=0.0, frequency_penalty=0.0, presence_penalty=0.0,
+                 logits_processor=None, use_cache=True, stopping_criteria=None):
+        """
+        Sample max_new_tokens tokens after idx. stopping_criteria, one
+        StoppingCriteria per row, ends generation early once every row has
+        stopped; tokens sampled for a row after it stopped are meaningless and the
+        final text of each row is in its criteria.
+        """
+        if logits_processor is None:
+            logits_processor = build_logits_processors(
+                temperature=temperature,
+                top_k=top_k,
+                top_p=top_p,
+                min_p=min_p,
+                repetition_penalty=repetition_penalty,
+                frequency_penalty=frequency_penalty,
+                presence_penalty=presence_penalty
+            )
 
-            if top_k is not None:
-                v, _ = torch.topk(logits, min(top_k, logits.size(-1)))
-                logits[logits < v[:, [-1]]] = -float('Inf')
+        kv_cache = self.new_cache() if use_cache else None
+        for _ in range(max_new_tokens):
+            idx_cond = idx if idx.size(1) <= self.block_size else idx[:, -self.block_size:]
+            logits, kv_cache = self._next_logits(idx, kv_cache)
+            logits = logits_processor(idx_cond, logits)
 
             probs = F.softmax(logits, dim=-1)
             idx_next = torch.multinomial(probs, num_samples=1)
 
             idx = torch.cat((idx, idx_next), dim=1)
 
-        return idx
\ No newline at end of file
+            if stopping_criteria is not None:
+                for criteria, token_id in zip(stopping_criteria, idx_next.squeeze(1).tolist()):
+                    criteria.push(token_id)
+                if all(criteria.stopped for criteria in stopping_criteria):
+                    break
+
+        return idx
+
+def convert_legacy_state_dict(state_dict):
+    """
+    Convert a checkpoint saved with per-head Head modules (heads.{h}.query/key/value
+    and a tril buffer per head) into the fused qkv layout of MultiHeadAttention.
+    State dicts already in the fused layout are returned unchanged.
+    """
+    converted = {}
+    heads = {}
+    for name, tensor in state_dict.items():
+        if '.sa.heads.' not in name:
+            converted[name] = tensor
+            continue
+        prefix, rest = name.split('.sa.heads.', 1)
+        head_idx, param = rest.split('.', 1)
+        if param == 'tril':
+            continue
+        heads.setdefault(prefix, {}).setdefault(param, {})[int(head_idx)] = tensor
+
+    for prefix, params in heads.items():
+        fused = []
+        for proj in ('query', 'key', 'value'):
+            weights = params[f'{proj}.weight']
+            fused.extend(weights[h] for h in sorted(weights))
+        converted[f'{prefix}.sa.qkv.weight'] = torch.cat(fused, dim=0)
+
+    return converted
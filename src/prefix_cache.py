@@ -0,0 +1,127 @@
+import collections
+
+import torch
+
+class _Block:
+    __slots__ = ('parent', 'tokens', 'layers', 'nbytes')
+
+    def __init__(self, parent, tokens, layers):
+        self.parent = parent
+        self.tokens = tokens
+        self.layers = layers
+        self.nbytes = sum(k.nbytes + v.nbytes for k, v in layers)
+
+class PrefixCache:
+    """
+    Key/value states of previously prefilled prompts, reusable by later prompts
+    that start with the same tokens.
+
+    Prompts are split into blocks of block_tokens ids. A block is keyed by a hash
+    chained over every token up to its end, so a lookup walks the prompt block by
+    block and stops at the first miss, giving the longest cached prefix. Each block
+    stores the per-layer (n_head, block_tokens, head_size) keys and values of its
+    own tokens only.
+
+    Entries are evicted least recently used first once their total size exceeds
+    max_bytes. A lookup refreshes the blocks it matched from the last to the first,
+    so children are always evicted before the prefixes they extend.
+    """
+    def __init__(self, max_bytes, block_tokens=16):
+        self.max_bytes = max_bytes
+        self.block_tokens = block_tokens
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.hit_tokens = 0
+        self.lookup_tokens = 0
+        self._blocks = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def _chain(self, ids, limit):
+        """Yield (end, key, parent_key, tokens) for every full block of ids[:limit]."""
+        parent = None
+        for end in range(self.block_tokens, limit + 1, self.block_tokens):
+            tokens = tuple(ids[end - self.block_tokens:end])
+            key = hash((parent, tokens))
+            yield end, key, parent, tokens
+            parent = key
+
+    def _touch(self, keys):
+        for key in reversed(keys):
+            self._blocks.move_to_end(key)
+
+    def lookup(self, ids):
+        """
+        Longest cached prefix of ids, as (length, [(k, v) per layer]) with k and v
+        shaped (n_head, length, head_size), or (0, None). At least the last token
+        is always left out so the caller still gets its logits.
+        """
+        keys = []
+        for _, key, parent, tokens in self._chain(ids, len(ids) - 1):
+            block = self._blocks.get(key)
+            if block is None or block.parent != parent or block.tokens != tokens:
+                break
+            keys.append(key)
+
+        self.lookup_tokens += len(ids)
+        if not keys:
+            self.misses += 1
+            return 0, None
+        self.hits += 1
+        self._touch(keys)
+
+        length = len(keys) * self.block_tokens
+        self.hit_tokens += length
+        blocks = [self._blocks[key].layers for key in keys]
+        layers = [
+            (torch.cat([b[i][0] for b in blocks], dim=1), torch.cat([b[i][1] for b in blocks], dim=1))
+            for i in range(len(blocks[0]))
+        ]
+        return length, layers
+
+    def insert(self, ids, layers):
+        """
+        Store the full blocks of ids. layers holds one (k, v) pair per layer with k
+        and v shaped (n_head, len(ids), head_size) for exactly these tokens.
+        """
+        keys = []
+        for end, key, parent, tokens in self._chain(ids, len(ids)):
+            block = self._blocks.get(key)
+            if block is not None and (block.parent != parent or block.tokens != tokens):
+                # Hash collision with a different prefix, keep the existing entry
+                break
+            if block is None:
+                block = _Block(parent, tokens, [
+                    (k[:, end - self.block_tokens:end].clone(), v[:, end - self.block_tokens:end].clone())
+                    for k, v in layers
+                ])
+                if block.nbytes > self.max_bytes:
+                    break
+                self._blocks[key] = block
+                self.nbytes += block.nbytes
+            keys.append(key)
+        self._touch(keys)
+        self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._blocks:
+            _, block = self._blocks.popitem(last=False)
+            self.nbytes -= block.nbytes
+
+    def clear(self):
+        self._blocks.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._blocks),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'reused_tokens': self.hit_tokens,
+            'reused_fraction': self.hit_tokens / self.lookup_tokens if self.lookup_tokens else 0.0,
+        }
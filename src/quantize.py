@@ -0,0 +1,102 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import torch
+import torch.nn as nn
+from tokenizers import Tokenizer
+
+import config
+from src.checkpoint import atomic_save, load_checkpoint_model
+from src.evaluate import evaluate_tokens
+
+logger = logging.getLogger("IncunabuLM")
+
+def quantize_model(model):
+    """
+    INT8 dynamic quantization for CPU inference. Every nn.Linear (the fused qkv and
+    output projections of attention, FeedForward.net and lm_head) gets int8 weights
+    with activations quantized on the fly; embeddings and norms stay in fp32.
+    """
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def load_quantized_model(path, model):
+    """
+    Load a state_dict saved by save_quantized_model. model is an fp32
+    TransformerDecoder of the same size, used only for its structure.
+    """
+    model = quantize_model(model)
+    # Packed int8 weights are not plain tensors, so this cannot use weights_only=True
+    model.load_state_dict(torch.load(path, map_location='cpu', weights_only=False))
+    model.eval()
+    return model
+
+def save_quantized_model(model, path):
+    atomic_save(model.state_dict(), path)
+
+def model_size_mb(model):
+    size = sum(t.numel() * t.element_size() for t in model.state_dict().values() if torch.is_tensor(t))
+    # Packed linear weights are stored outside the regular tensors of the state_dict.
+    # Only the dynamic Linear itself unpacks them: its nested LinearPackedParams also
+    # has a _packed_params attribute, the prepacked object without _weight_bias.
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear):
+            weight, bias = module._weight_bias()
+            size += weight.numel() * weight.element_size()
+            if bias is not None:
+                size += bias.numel() * bias.element_size()
+    return size / 2**20
+
+def perplexity_check(reference, quantized, text_path, tokenizer_path, block_size, batch_size=4, max_windows=64):
+    """Perplexity of both models on the same windows of text_path."""
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+    with open(text_path, 'r', encoding='utf-8') as f:
+        tokens = torch.tensor(tokenizer.encode(f.read()).ids, dtype=torch.long)
+    return {
+        'reference': evaluate_tokens(reference, tokens, block_size, batch_size, max_windows=max_windows),
+        'quantized': evaluate_tokens(quantized, tokens, block_size, batch_size, max_windows=max_windows),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a model checkpoint to INT8 and check its perplexity.")
+    parser.add_argument('--checkpoint', default=config.MODEL_PATH)
+    parser.add_argument('--output', default=config.QUANTIZED_MODEL_PATH)
+    parser.add_argument('--check-text', default='data/polish_poems_finetunning.txt')
+    parser.add_argument('--max-windows', type=int, default=64)
+    parser.add_argument('--max-ppl-increase', type=float, default=0.05,
+                        help="Fail if quantized perplexity exceeds the fp32 one by more than this fraction")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    torch.set_grad_enabled(False)
+
+    reference, cfg, _ = load_checkpoint_model(args.checkpoint, 'cpu')
+    quantized = quantize_model(reference)  # quantize_dynamic works on a copy
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    save_quantized_model(quantized, args.output)
+    logger.info(f"Saved quantized model to {args.output} "
+                f"({model_size_mb(reference):.0f} MB -> {model_size_mb(quantized):.0f} MB)")
+
+    if not args.check_text:
+        return
+    result = perplexity_check(reference, quantized, args.check_text, config.TOKENIZER_PATH, cfg.BLOCK_SIZE,
+                              max_windows=args.max_windows)
+    increase = result['quantized']['perplexity'] / result['reference']['perplexity'] - 1
+    result['perplexity_increase'] = increase
+    print(json.dumps(result, indent=2))
+    if increase > args.max_ppl_increase:
+        logger.error(f"Quantized perplexity is {increase:.1%} higher than fp32 (limit {args.max_ppl_increase:.1%})")
+        sys.exit(1)
+    logger.info(f"Perplexity change {increase:+.2%}, "
+                f"speedup {result['quantized']['tokens_per_sec'] / result['reference']['tokens_per_sec']:.2f}x")
+
+if __name__ == '__main__':
+    main()
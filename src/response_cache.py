@@ -0,0 +1,215 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("IncunabuLM")
+
+def checkpoint_fingerprint(*paths):
+    """
+    Identify model weights without hashing whole checkpoints: path, size and
+    modification time of each file plus a hash of its first and last MiB.
+    Missing paths contribute only their name.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path).encode('utf-8'))
+        if not path or not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read(1 << 20))
+            if stat.st_size > 2 << 20:
+                f.seek(-(1 << 20), os.SEEK_END)
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def request_key(payload, fingerprint):
+    """Key of a request: its parameters, normalized to sorted JSON, plus the model fingerprint."""
+    normalized = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(f'{fingerprint}\n{normalized}'.encode('utf-8')).hexdigest()
+
+class MemoryBackend:
+    """In-process LRU of at most max_entries entries, each valid for ttl seconds."""
+    def __init__(self, max_entries=1024, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class DiskBackend:
+    """
+    One JSON file per entry in directory, shared by every worker process.
+    The file's mtime is its last use: hits refresh it, entries older than ttl
+    are expired and the least recently used files are removed beyond max_entries.
+    The directory is scanned for eviction only every evict_interval writes of a
+    process (default a tenth of max_entries), so it may briefly hold more entries.
+    """
+    def __init__(self, directory, max_entries=10000, ttl=86400.0, evict_interval=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_interval = evict_interval or max(1, max_entries // 10)
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _files(self):
+        return [e for e in os.scandir(self.directory) if e.name.endswith('.json')]
+
+    def __len__(self):
+        return len(self._files())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            # Expiry counts from when the entry was written, kept in the file
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            expired = time.time() - entry['stored_at'] > self.ttl
+            value = entry['value']
+        except OSError:
+            return None
+        except (ValueError, KeyError, TypeError):
+            # Not an entry this cache wrote (foreign or truncated file): a miss, and removed
+            expired = True
+        if expired:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'stored_at': time.time(), 'value': value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._writes += 1
+        if self._writes % self.evict_interval == 0:
+            self._evict()
+
+    @staticmethod
+    def _mtime(entry):
+        # Another worker may have removed the file since the scan; it sorts as the oldest
+        try:
+            return entry.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    def _evict(self):
+        files = self._files()
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=self._mtime)
+        for entry in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in self._files():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+class ResponseCache:
+    """
+    Cache of finished /generate responses keyed on the normalized request and
+    the fingerprint of the served weights, so swapping checkpoints invalidates
+    every entry. A disk backend keeps the fingerprint it was filled with and is
+    cleared when it changes.
+    """
+    def __init__(self, backend, fingerprint):
+        self.backend = backend
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        if isinstance(backend, DiskBackend):
+            self._check_fingerprint(os.path.join(backend.directory, 'FINGERPRINT'))
+
+    def _check_fingerprint(self, path):
+        previous = None
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                previous = f.read().strip()
+        if previous != self.fingerprint:
+            self.backend.clear()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.fingerprint)
+
+    def key(self, payload):
+        return request_key(payload, self.fingerprint)
+
+    def get(self, key):
+        """The cached response or None; a failed lookup is logged and counts as a miss."""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Could not read cached response {key}: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a response; a failed write is logged and never fails the request that produced it."""
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"Could not cache response {key}: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,110 @@
+import torch
+from torch.nn import functional as F
+
+# Every processor takes (input_ids, logits) with input_ids of shape (B, T) and
+# logits of shape (B, vocab_size) and returns new logits. Sampling parameters are
+# either a single value for the whole batch or a sequence with one value per row.
+
+def _per_row(value, logits):
+    if isinstance(value, (list, tuple)):
+        return torch.tensor(value, dtype=logits.dtype, device=logits.device).unsqueeze(1)
+    return value
+
+def _is_noop(value, neutral):
+    if isinstance(value, (list, tuple)):
+        return all(v == neutral for v in value)
+    return value == neutral
+
+class RepetitionPenaltyLogitsProcessor:
+    def __init__(self, penalty):
+        self.penalty = penalty
+
+    def __call__(self, input_ids, logits):
+        penalty = _per_row(self.penalty, logits)
+        score = logits.gather(1, input_ids)
+        score = torch.where(score > 0, score / penalty, score * penalty)
+        return logits.scatter(1, input_ids, score)
+
+class FrequencyPresencePenaltyLogitsProcessor:
+    def __init__(self, frequency_penalty=0.0, presence_penalty=0.0):
+        self.frequency_penalty = frequency_penalty
+        self.presence_penalty = presence_penalty
+
+    def __call__(self, input_ids, logits):
+        counts = torch.zeros_like(logits).scatter_add_(1, input_ids, torch.ones_like(input_ids, dtype=logits.dtype))
+        logits = logits - _per_row(self.frequency_penalty, logits) * counts
+        logits = logits - _per_row(self.presence_penalty, logits) * (counts > 0).to(logits.dtype)
+        return logits
+
+class TemperatureLogitsWarper:
+    def __init__(self, temperature):
+        self.temperature = temperature
+
+    def __call__(self, input_ids, logits):
+        return logits / _per_row(self.temperature, logits)
+
+class TopKLogitsWarper:
+    def __init__(self, top_k):
+        self.top_k = top_k
+        # Kept on the host so the batched topk never has to read it back from the device
+        self.max_k = max(top_k) if isinstance(top_k, (list, tuple)) else top_k
+
+    def __call__(self, input_ids, logits):
+        vocab_size = logits.size(-1)
+        v, _ = torch.topk(logits, min(self.max_k, vocab_size))
+        if isinstance(self.top_k, (list, tuple)):
+            kth = torch.tensor([min(k, vocab_size) - 1 for k in self.top_k], device=logits.device)
+            threshold = v.gather(1, kth.unsqueeze(1))
+        else:
+            threshold = v[:, [-1]]
+        return logits.masked_fill(logits < threshold, -float('Inf'))
+
+class TopPLogitsWarper:
+    def __init__(self, top_p):
+        self.top_p = top_p
+
+    def __call__(self, input_ids, logits):
+        sorted_logits, sorted_idx = torch.sort(logits, descending=True, dim=-1)
+        probs = F.softmax(sorted_logits, dim=-1)
+        # A token is dropped when the tokens ranked above it already cover top_p,
+        # so the most likely token always survives
+        remove = (probs.cumsum(dim=-1) - probs) > _per_row(self.top_p, logits)
+        sorted_logits = sorted_logits.masked_fill(remove, -float('Inf'))
+        return torch.empty_like(logits).scatter(1, sorted_idx, sorted_logits)
+
+class MinPLogitsWarper:
+    def __init__(self, min_p):
+        self.min_p = min_p
+
+    def __call__(self, input_ids, logits):
+        probs = F.softmax(logits, dim=-1)
+        threshold = probs.amax(dim=-1, keepdim=True) * _per_row(self.min_p, logits)
+        return logits.masked_fill(probs < threshold, -float('Inf'))
+
+class LogitsProcessorList(list):
+    def __call__(self, input_ids, logits):
+        for processor in self:
+            logits = processor(input_ids, logits)
+        return logits
+
+def build_logits_processors(temperature=1.0, top_k=None, top_p=1.0, min_p=0.0,
+                            repetition_penalty=1.0, frequency_penalty=0.0, presence_penalty=0.0):
+    """
+    Build the default sampling pipeline, skipping processors whose parameters
+    leave the logits unchanged. Penalties run first, then temperature and the
+    truncation warpers, matching the order of the original generate loop.
+    """
+    processors = LogitsProcessorList()
+    if not _is_noop(repetition_penalty, 1.0):
+        processors.append(RepetitionPenaltyLogitsProcessor(repetition_penalty))
+    if not (_is_noop(frequency_penalty, 0.0) and _is_noop(presence_penalty, 0.0)):
+        processors.append(FrequencyPresencePenaltyLogitsProcessor(frequency_penalty, presence_penalty))
+    if not _is_noop(temperature, 1.0):
+        processors.append(TemperatureLogitsWarper(temperature))
+    if top_k is not None:
+        processors.append(TopKLogitsWarper(top_k))
+    if top_p is not None and not _is_noop(top_p, 1.0):
+        processors.append(TopPLogitsWarper(top_p))
+    if min_p is not None and not _is_noop(min_p, 0.0):
+        processors.append(MinPLogitsWarper(min_p))
+    return processors
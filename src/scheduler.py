@@ -0,0 +1,364 @@
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+from contextlib import nullcontext
+
+import torch
+from torch.nn import functional as F
+
+from src.model import left_pad
+from src.sampling import build_logits_processors
+
+logger = logging.getLogger("IncunabuLM")
+
+def _resolve(future, result=None, exception=None):
+    # The client may cancel the future at any moment from another thread
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except concurrent.futures.InvalidStateError:
+        pass
+
+class GenerationRequest:
+    def __init__(self, prompt_ids, max_new_tokens, temperature=1.0, top_k=None, top_p=1.0, min_p=0.0,
+                 repetition_penalty=1.0, frequency_penalty=0.0, presence_penalty=0.0, seed=None, stopping=None,
+                 on_token=None):
+        self.prompt_ids = list(prompt_ids)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.min_p = min_p
+        self.repetition_penalty = repetition_penalty
+        self.frequency_penalty = frequency_penalty
+        self.presence_penalty = presence_penalty
+        self.seed = seed
+        self.generator = None
+        self.stopping = stopping
+        self.on_token = on_token
+        self.generated = []
+        self.future = concurrent.futures.Future()
+        self.submitted_at = time.monotonic()
+
+    @property
+    def finished(self):
+        if self.stopping is not None and self.stopping.stopped:
+            return True
+        return self.future.cancelled() or len(self.generated) >= self.max_new_tokens
+
+class BatchScheduler:
+    """
+    Continuous-batching decode loop running on its own thread.
+
+    Pending requests are admitted between decode steps, left-padded and prefilled
+    together, then merged into the running batch so every active sequence advances
+    by one token per model call. Finished sequences leave the batch immediately.
+    When the batch is empty the scheduler waits up to max_wait seconds after the
+    first arrival so that requests arriving together share their prefill.
+
+    Sequences are kept within the model's block_size: prompts are truncated from
+    the left to leave room for max_new_tokens.
+
+    With a PrefixCache, the longest cached prefix of every prompt is copied into
+    the batch cache and only the remaining tokens are prefilled; the prompt's
+    key/value states are stored back for later requests.
+
+    A request with a StoppingCriteria leaves the batch as soon as it stops, e.g.
+    on EOS, so no decode steps are spent on text that would be thrown away.
+
+    Requests admitted together with identical prompts (e.g. several samples of
+    one prompt) are prefilled once and the resulting rows are copied for each.
+    A request with a seed samples from its own torch.Generator, so its output does
+    not depend on the other sequences in the batch.
+
+    With a ServerMetrics, queue wait, prefill, decode and sampling times are recorded.
+    """
+    def __init__(self, model, pad_token_id, max_batch_size=8, max_wait=0.01, device='cpu', prefix_cache=None,
+                 metrics=None):
+        self.model = model
+        self.pad_token_id = pad_token_id
+        self.prefix_cache = prefix_cache
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.device = device
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self._active = []
+        self._cache = None
+        self._tokens = None      # (B, S) ids aligned with the cache, padded with pad_token_id
+        self._positions = None   # (B,) position of the next token of each row
+        self._last = None        # (B, 1) last sampled token, not yet in the cache
+        self._processors = None
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    @property
+    def active_sequences(self):
+        return len(self._active)
+
+    def submit(self, prompt_ids, max_new_tokens, **sampling):
+        """
+        Queue a prompt for generation. Returns a concurrent.futures.Future resolving
+        to the list of generated token ids; cancelling it drops the sequence from the
+        batch. on_token, if given, is called from the scheduler thread with every
+        sampled token id.
+        """
+        return self.submit_many([prompt_ids], max_new_tokens, **sampling)[0]
+
+    def submit_many(self, prompts, max_new_tokens, seeds=None, stopping=None, on_token=None, **sampling):
+        """
+        Queue several prompts at once so they are admitted, and their shared
+        prompts prefilled, together. seeds and stopping give one seed and one
+        StoppingCriteria (or None) per prompt. Returns one Future per prompt.
+        """
+        max_new_tokens = min(max_new_tokens, self.model.block_size - 1)
+        seed = sampling.pop('seed', None)
+        seeds = seeds or [seed] * len(prompts)
+        criteria = sampling.pop('stopping', None)
+        stopping = stopping or [criteria] * len(prompts)
+        requests = []
+        for prompt_ids, seed, criteria in zip(prompts, seeds, stopping):
+            prompt_ids = list(prompt_ids)[-(self.model.block_size - max_new_tokens):]
+            request = GenerationRequest(prompt_ids, max_new_tokens, seed=seed, stopping=criteria, on_token=on_token, **sampling)
+            if seed is not None:
+                request.generator = torch.Generator(device=self.device).manual_seed(seed)
+            requests.append(request)
+        with self._cond:
+            self._pending.extend(requests)
+            self._cond.notify()
+        return [request.future for request in requests]
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _timed(self, stage):
+        return self.metrics.time(stage) if self.metrics is not None else nullcontext()
+
+    def _loop(self):
+        with torch.inference_mode():
+            while self._running:
+                requests = self._admit()
+                try:
+                    if requests:
+                        self._prefill(requests)
+                    if self._active:
+                        self._step()
+                except Exception as e:
+                    logger.error(f"Batch step failed: {e}")
+                    for request in self._active + requests:
+                        if not request.future.done():
+                            _resolve(request.future, exception=e)
+                    self._reset_batch()
+
+    def _admit(self):
+        with self._cond:
+            if not self._active:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_wait
+                while self._running and len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            requests = []
+            while self._pending and len(self._active) + len(requests) < self.max_batch_size:
+                request = self._pending.popleft()
+                if not request.future.cancelled():
+                    requests.append(request)
+            if self.metrics is not None:
+                now = time.monotonic()
+                for request in requests:
+                    self.metrics.observe('queue', now - request.submitted_at)
+            return requests
+
+    def _prefill(self, requests):
+        # Identical prompts are prefilled once, their rows are copied afterwards
+        unique = {}
+        rows = [unique.setdefault(tuple(r.prompt_ids), len(unique)) for r in requests]
+        prompts = [list(ids) for ids in unique]
+        prefixes = [self.prefix_cache.lookup(ids) if self.prefix_cache is not None else (0, None) for ids in prompts]
+        cache, prefix_idx = self._prefix_batch(prefixes, prompts)
+
+        # Only the tokens after each cached prefix go through the model
+        suffixes = [ids[n:] for ids, (n, _) in zip(prompts, prefixes)]
+        lengths = [len(ids) for ids in suffixes]
+        length = max(lengths)
+        idx = torch.full((len(prompts), length), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(prompts), length), dtype=torch.bool)
+        for i, ids in enumerate(suffixes):
+            idx[i, length - lengths[i]:] = torch.tensor(ids, dtype=torch.long)
+            mask[i, length - lengths[i]:] = True
+        idx, mask = idx.to(self.device), mask.to(self.device)
+        offsets = torch.tensor([n for n, _ in prefixes], dtype=torch.long, device=self.device)
+        position_ids = (mask.long().cumsum(dim=1) - 1).clamp(min=0) + offsets.unsqueeze(1)
+
+        with self._timed('prefill'):
+            logits, _ = self.model(idx, kv_cache=cache, position_ids=position_ids, attention_mask=mask)
+        if self.metrics is not None:
+            self.metrics.prompt_tokens.inc(sum(lengths))
+        positions = torch.tensor([len(ids) for ids in prompts], dtype=torch.long, device=self.device)
+        if prefix_idx is not None:
+            idx = torch.cat((prefix_idx, idx), dim=1)
+        if self.prefix_cache is not None:
+            self._store_prefixes(prompts, prefixes, cache)
+        if len(prompts) < len(requests):
+            index = torch.tensor(rows, dtype=torch.long, device=self.device)
+            cache.select(index)
+            idx = idx.index_select(0, index)
+            logits = logits.index_select(0, index)
+            positions = positions.index_select(0, index)
+
+        first_new = len(self._active)
+        if self._cache is None:
+            self._cache, self._tokens, self._positions = cache, idx, positions
+        else:
+            width = max(self._tokens.size(1), idx.size(1))
+            self._cache.extend(cache)
+            self._tokens = torch.cat((left_pad(self._tokens, width, 1, self.pad_token_id),
+                                      left_pad(idx, width, 1, self.pad_token_id)), dim=0)
+            self._positions = torch.cat((self._positions, positions))
+        self._active.extend(requests)
+        self._processors = None
+
+        next_tokens = self._sample(logits[:, -1, :], rows=slice(first_new, None))
+        self._last = next_tokens if self._last is None else torch.cat((self._last, next_tokens))
+        self._retire_finished()
+
+    def _prefix_batch(self, prefixes, prompts):
+        """A cache holding the cached prefixes left-padded to a common length, and their token ids."""
+        cache = self.model.new_cache()
+        length = max(n for n, _ in prefixes)
+        if length == 0:
+            return cache, None
+
+        idx = torch.full((len(prompts), length), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(prompts), length), dtype=torch.bool)
+        for i, (n, _) in enumerate(prefixes):
+            idx[i, length - n:] = torch.tensor(prompts[i][:n], dtype=torch.long)
+            mask[i, length - n:] = True
+        for l, layer in enumerate(cache.layers):
+            ks, vs = [], []
+            for n, layers in prefixes:
+                if layers is None:
+                    k = v = self._empty_prefix(prefixes, l)
+                else:
+                    k, v = layers[l]
+                ks.append(left_pad(k, length, 1))
+                vs.append(left_pad(v, length, 1))
+            layer.k, layer.v = torch.stack(ks), torch.stack(vs)
+        cache.length = length
+        cache.mask = mask.to(self.device)
+        return cache, idx.to(self.device)
+
+    @staticmethod
+    def _empty_prefix(prefixes, layer):
+        k = next(layers[layer][0] for _, layers in prefixes if layers is not None)
+        return k[:, :0]
+
+    def _store_prefixes(self, prompts, prefixes, cache):
+        block_tokens = self.prefix_cache.block_tokens
+        for i, (ids, (n, _)) in enumerate(zip(prompts, prefixes)):
+            if len(ids) // block_tokens * block_tokens <= n:
+                continue
+            valid = cache.mask[i]
+            self.prefix_cache.insert(ids, [(layer.k[i][:, valid], layer.v[i][:, valid]) for layer in cache.layers])
+
+    def _step(self):
+        t0 = time.perf_counter()
+        logits, _ = self.model(self._last, kv_cache=self._cache, position_ids=self._positions.unsqueeze(1))
+        if self.metrics is not None:
+            seconds = time.perf_counter() - t0
+            self.metrics.observe('decode', seconds)
+            self.metrics.decode_tokens_per_sec.set(len(self._active) / seconds)
+        self._tokens = torch.cat((self._tokens, self._last), dim=1)
+        self._positions = self._positions + 1
+        self._last = self._sample(logits[:, -1, :])
+        self._retire_finished()
+
+    def _build_processors(self, requests, vocab_size):
+        return build_logits_processors(
+            temperature=[r.temperature for r in requests],
+            top_k=None if all(r.top_k is None for r in requests) else [min(r.top_k or vocab_size, vocab_size) for r in requests],
+            top_p=[r.top_p for r in requests],
+            min_p=[r.min_p for r in requests],
+            repetition_penalty=[r.repetition_penalty for r in requests],
+            frequency_penalty=[r.frequency_penalty for r in requests],
+            presence_penalty=[r.presence_penalty for r in requests]
+        )
+
+    def _sample(self, logits, rows=slice(None)):
+        requests = self._active[rows]
+        if rows == slice(None):
+            if self._processors is None:
+                self._processors = self._build_processors(requests, logits.size(-1))
+            processors = self._processors
+        else:
+            processors = self._build_processors(requests, logits.size(-1))
+
+        with self._timed('sample'):
+            logits = processors(self._tokens[rows], logits)
+            probs = F.softmax(logits, dim=-1)
+            next_tokens = torch.multinomial(probs, num_samples=1)
+            for i, request in enumerate(requests):
+                if request.generator is not None:
+                    next_tokens[i] = torch.multinomial(probs[i], num_samples=1, generator=request.generator)
+        if self.metrics is not None:
+            self.metrics.tokens.inc(len(requests))
+        for request, token_id in zip(requests, next_tokens.squeeze(1).tolist()):
+            request.generated.append(token_id)
+            if request.stopping is not None:
+                request.stopping.push(token_id)
+            if request.on_token is not None:
+                request.on_token(token_id)
+        return next_tokens
+
+    def _retire_finished(self):
+        keep = [i for i, r in enumerate(self._active) if not r.finished]
+        if len(keep) == len(self._active):
+            return
+
+        for r in self._active:
+            if r.finished:
+                _resolve(r.future, r.generated)
+        if not keep:
+            self._reset_batch()
+            return
+
+        index = torch.tensor(keep, dtype=torch.long, device=self.device)
+        self._cache.select(index)
+        self._tokens = self._tokens.index_select(0, index)
+        self._positions = self._positions.index_select(0, index)
+        self._last = self._last.index_select(0, index)
+        self._active = [self._active[i] for i in keep]
+        self._processors = None
+
+        dropped = self._cache.trim()
+        if dropped:
+            self._tokens = self._tokens[:, dropped:]
@@ -0,0 +1,159 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+import torch
+import uvicorn
+
+logger = logging.getLogger("IncunabuLM")
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def worker_cpus(worker, threads):
+    """The CPU ids worker is pinned to, or None where affinity is not supported."""
+    if not hasattr(os, 'sched_getaffinity'):
+        return None
+    cpus = sorted(os.sched_getaffinity(0))
+    start = (worker * threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(threads)]
+
+def _run_worker(app, sock, worker, threads, components, setup):
+    # Started with fork: the model tensors were moved to shared memory by the
+    # supervisor, so every worker maps the same pages instead of copying them.
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    cpus = worker_cpus(worker, threads)
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+    setup(app, *components)
+    logger.info(f"Worker {worker} (pid {os.getpid()}) serving with {threads} threads on CPUs {cpus}")
+    server = uvicorn.Server(uvicorn.Config(app, log_level='info'))
+    server.run(sockets=[sock])
+
+class PreforkServer:
+    """
+    Pre-fork serving of a FastAPI app on CPU.
+
+    The supervisor loads the model once, moves its parameters and buffers into
+    shared memory with share_memory() and binds the listening socket. It then
+    forks num_workers processes, each running its own uvicorn server, batch
+    scheduler and metrics on the inherited socket; the kernel spreads incoming
+    connections across the workers accepting on it. Each worker is pinned to
+    threads_per_worker CPUs and uses that many torch threads, so the workers do
+    not compete for cores. Workers that die are restarted. A worker that dies
+    within min_uptime seconds of starting (a bad checkpoint, out of memory while
+    loading) is restarted after a delay doubling from restart_backoff up to
+    max_backoff; after max_quick_failures such deaths in a row the supervisor
+    stops every worker and exits with status 1.
+
+    load returns the arguments of setup after app, which is called in each
+    worker after the fork (main.setup_components).
+    """
+    def __init__(self, app, load, setup, host='0.0.0.0', port=8000, num_workers=None, threads_per_worker=None,
+                 min_uptime=10.0, restart_backoff=1.0, max_backoff=30.0, max_quick_failures=5):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Pre-fork serving needs a platform with fork()")
+        self.app = app
+        self.load = load
+        self.setup = setup
+        self.host = host
+        self.port = port
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        self.num_workers = num_workers or cpus
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.num_workers)
+        self.min_uptime = min_uptime
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.max_quick_failures = max_quick_failures
+        self._context = multiprocessing.get_context('fork')
+        self._workers = {}
+        self._started = {}
+        self._quick_failures = {}
+        self._restart_at = {}
+        self._stopping = False
+        self.exit_code = 0
+
+    def _start_worker(self, worker):
+        process = self._context.Process(
+            target=_run_worker,
+            args=(self.app, self.sock, worker, self.threads_per_worker, self.components, self.setup),
+            name=f"incunabulm-worker-{worker}",
+            daemon=False
+        )
+        process.start()
+        self._workers[worker] = process
+        self._started[worker] = time.monotonic()
+
+    def _check_worker(self, worker, process):
+        now = time.monotonic()
+        if worker in self._restart_at:
+            if now >= self._restart_at[worker]:
+                del self._restart_at[worker]
+                self._start_worker(worker)
+            return
+        if process.is_alive():
+            return
+
+        if now - self._started[worker] >= self.min_uptime:
+            self._quick_failures[worker] = 0
+            logger.error(f"Worker {worker} exited with code {process.exitcode}, restarting")
+            self._start_worker(worker)
+            return
+        failures = self._quick_failures[worker] = self._quick_failures.get(worker, 0) + 1
+        if failures >= self.max_quick_failures:
+            logger.error(f"Worker {worker} exited with code {process.exitcode} within {self.min_uptime:.0f}s of "
+                         f"starting {failures} times in a row, shutting down")
+            self._stopping = True
+            self.exit_code = 1
+            return
+        delay = min(self.max_backoff, self.restart_backoff * 2 ** (failures - 1))
+        logger.error(f"Worker {worker} exited with code {process.exitcode} during startup, restarting in {delay:.1f}s")
+        self._restart_at[worker] = now + delay
+
+    def _stop(self, signum=None, frame=None):
+        self._stopping = True
+
+    def run(self):
+        # Intra-op thread pools do not survive fork; keep the supervisor single-threaded
+        torch.set_num_threads(1)
+        t0 = time.perf_counter()
+        self.components = self.load()
+        for component in self.components:
+            if isinstance(component, torch.nn.Module):
+                if next(component.parameters()).is_cuda:
+                    raise RuntimeError("Pre-fork serving is CPU only, CUDA cannot be used across fork()")
+                component.share_memory()
+        logger.info(f"Supervisor loaded the model in {time.perf_counter() - t0:.1f}s, starting {self.num_workers} "
+                    f"workers with {self.threads_per_worker} threads each on http://{self.host}:{self.port}")
+
+        self.sock = bind_socket(self.host, self.port)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for worker in range(self.num_workers):
+            self._start_worker(worker)
+
+        try:
+            while not self._stopping:
+                for worker, process in list(self._workers.items()):
+                    if not self._stopping:
+                        self._check_worker(worker, process)
+                time.sleep(0.5)
+        finally:
+            for process in self._workers.values():
+                if process.is_alive():
+                    process.terminate()
+            for process in self._workers.values():
+                process.join()
+            self.sock.close()
+        if self.exit_code:
+            sys.exit(self.exit_code)
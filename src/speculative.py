@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import torch
+from torch.nn import functional as F
+
+import config
+from src.checkpoint import load_checkpoint_model
+from src.sampling import build_logits_processors
+
+def draft_overrides():
+    """Model sizes of the draft model, applied on top of config.py."""
+    return {
+        'N_EMBD': config.DRAFT_N_EMBD,
+        'N_HEAD': config.DRAFT_N_HEAD,
+        'N_LAYER': config.DRAFT_N_LAYER,
+    }
+
+def load_draft_model(path, device='cpu'):
+    cfg = SimpleNamespace(**{name: getattr(config, name) for name in dir(config) if name.isupper()})
+    vars(cfg).update(draft_overrides())
+    model, _, _ = load_checkpoint_model(path, device, default_cfg=cfg)
+    return model
+
+class SpeculativeStats:
+    def __init__(self):
+        self.rounds = 0
+        self.proposed = 0
+        self.accepted = 0
+        self.tokens = 0
+
+    def update(self, proposed, accepted, tokens):
+        self.rounds += 1
+        self.proposed += proposed
+        self.accepted += accepted
+        self.tokens += tokens
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.proposed if self.proposed else 0.0
+
+    def as_dict(self):
+        return {
+            'rounds': self.rounds,
+            'proposed': self.proposed,
+            'accepted': self.accepted,
+            'acceptance_rate': self.acceptance_rate,
+            'tokens_per_round': self.tokens / self.rounds if self.rounds else 0.0,
+        }
+
+def _probs(logits_processor, input_ids, logits):
+    return F.softmax(logits_processor(input_ids, logits), dim=-1)
+
+@torch.no_grad()
+def speculative_generate(model, draft_model, idx, max_new_tokens, num_draft_tokens=4, logits_processor=None, **sampling):
+    """
+    Sample max_new_tokens after idx (a (1, T) tensor) with the same output
+    distribution as model.generate, using draft_model to propose tokens.
+
+    Every round the draft model samples up to num_draft_tokens tokens one by one,
+    then model scores all of them in a single forward pass. Draft token x is kept
+    with probability min(1, p(x) / q(x)), p and q being the processed target and
+    draft distributions; at the first rejection a replacement is sampled from
+    max(p - q, 0) and the rest of the draft is discarded. If everything is kept,
+    one more token is sampled from the target's last distribution, so each round
+    yields between 1 and num_draft_tokens + 1 tokens.
+
+    Sampling arguments are those of model.generate. Returns (idx, SpeculativeStats).
+    """
+    if idx.size(0) != 1:
+        raise ValueError("Speculative decoding supports a single sequence")
+    if logits_processor is None:
+        logits_processor = build_logits_processors(**sampling)
+
+    stats = SpeculativeStats()
+    window = min(model.block_size, draft_model.block_size)
+    cache, draft_cache = model.new_cache(), draft_model.new_cache()
+    generated = 0
+    while generated < max_new_tokens:
+        n = idx.size(1)
+        k = min(num_draft_tokens, max_new_tokens - generated - 1, window - n)
+        if k <= 0:
+            # Last token, or the sequence no longer fits the draft window: plain sampling
+            logits, cache = model._next_logits(idx, cache)
+            probs = _probs(logits_processor, idx[:, -model.block_size:], logits)
+            idx = torch.cat((idx, torch.multinomial(probs, num_samples=1)), dim=1)
+            generated += 1
+            continue
+
+        ctx, draft_probs = idx, []
+        for _ in range(k):
+            logits, _ = draft_model(ctx[:, len(draft_cache):], kv_cache=draft_cache)
+            q = _probs(logits_processor, ctx, logits[:, -1, :])
+            draft_probs.append(q)
+            ctx = torch.cat((ctx, torch.multinomial(q, num_samples=1)), dim=1)
+
+        # Logits at positions n-1 ... n+k-1 score the k draft tokens plus one extra
+        logits, _ = model(ctx[:, len(cache):], kv_cache=cache)
+        logits = logits[:, -(k + 1):, :]
+
+        accepted = 0
+        for j, q in enumerate(draft_probs):
+            p = _probs(logits_processor, ctx[:, :n + j], logits[:, j, :])
+            token = ctx[0, n + j]
+            if torch.rand(()).item() * q[0, token].item() < p[0, token].item():
+                accepted += 1
+                continue
+            residual = (p - q).clamp(min=0)
+            next_token = torch.multinomial(residual / residual.sum(), num_samples=1)
+            break
+        else:
+            next_token = torch.multinomial(_probs(logits_processor, ctx, logits[:, k, :]), num_samples=1)
+
+        idx = torch.cat((ctx[:, :n + accepted], next_token), dim=1)
+        cache.crop(n + accepted)
+        draft_cache.crop(n + accepted)
+        generated += accepted + 1
+        stats.update(k, accepted, accepted + 1)
+
+    return idx, stats
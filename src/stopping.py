@@ -0,0 +1,89 @@
+from src.streaming import SENTENCE_END, IncrementalDetokenizer
+
+EOS_TOKENS = ('[EOS]', '<|endoftext|>')
+
+def eos_token_ids(tokenizer):
+    return [i for i in (tokenizer.token_to_id(t) for t in EOS_TOKENS) if i is not None]
+
+class StoppingCriteria:
+    """
+    Stop conditions of one generated sequence, fed one sampled token at a time.
+
+    A sequence stops at the first of:
+      * an EOS token id ('eos'),
+      * any of stop_strings appearing in the decoded text ('stop_string'); the
+        text ends right before it,
+      * a sentence-ending mark in a token sampled once at least
+        sentence_end_after tokens were generated ('sentence_end').
+    reason stays None until one of them triggers.
+
+    The generated text is decoded incrementally. push returns the part of it that
+    is final: text that could still turn out to be the start of a stop string is
+    held back until it either completes the match or cannot anymore.
+    """
+    def __init__(self, tokenizer, prompt_ids, eos_token_ids=(), stop_strings=(), sentence_end_after=None):
+        self.eos_token_ids = set(eos_token_ids)
+        self.stop_strings = [s for s in stop_strings if s]
+        self.sentence_end_after = sentence_end_after
+        self.detokenizer = IncrementalDetokenizer(tokenizer, prompt_ids)
+        self.holdback = max((len(s) for s in self.stop_strings), default=1) - 1
+        self.num_tokens = 0
+        self.reason = None
+        self.text = ''
+        self._pending = ''
+
+    @property
+    def stopped(self):
+        return self.reason is not None
+
+    def _release(self, upto):
+        released, self._pending = self._pending[:upto], self._pending[upto:]
+        self.text += released
+        return released
+
+    def _check_stop_strings(self, delta):
+        # Only matches that overlap the new text need to be looked for
+        start = max(len(self._pending) - len(delta) - self.holdback, 0)
+        matches = [i for i in (self._pending.find(s, start) for s in self.stop_strings) if i != -1]
+        return min(matches) if matches else None
+
+    def push(self, token_id):
+        """Record one sampled token. Returns newly finalized text."""
+        if self.stopped:
+            return ''
+        self.num_tokens += 1
+        if token_id in self.eos_token_ids:
+            self.reason = 'eos'
+            return self._release(len(self._pending))
+
+        delta = self.detokenizer.push(token_id)
+        self._pending += delta
+
+        cut = self._check_stop_strings(delta) if self.stop_strings else None
+        if cut is not None:
+            self.reason = 'stop_string'
+            released = self._release(cut)
+            self._pending = ''
+            return released
+
+        if self.sentence_end_after is not None and self.num_tokens >= self.sentence_end_after:
+            end = max(delta.rfind(p) for p in SENTENCE_END)
+            if end != -1:
+                self.reason = 'sentence_end'
+                return self._release(len(self._pending) - len(delta) + end + 1)
+
+        return self._release(max(len(self._pending) - self.holdback, 0))
+
+    def flush(self):
+        """Release whatever is still held back once generation is over."""
+        if self.stopped:
+            self._pending = ''
+            return ''
+        self._pending += self.detokenizer.flush()
+        cut = self._check_stop_strings(self._pending) if self.stop_strings else None
+        if cut is not None:
+            self.reason = 'stop_string'
+            released = self._release(cut)
+            self._pending = ''
+            return released
+        return self._release(len(self._pending))
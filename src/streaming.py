@@ -0,0 +1,43 @@
+SENTENCE_END = ('.', '?', '!')
+
+def trim_to_sentence_end(text, start=0):
+    """Cut text after its last sentence-ending mark, if that mark lies at or after start."""
+    cut = max(text.rfind(p) for p in SENTENCE_END)
+    if cut != -1 and cut >= start:
+        return text[:cut + 1]
+    return text
+
+class IncrementalDetokenizer:
+    """
+    Turns a growing sequence of token ids into text deltas.
+
+    Byte-level BPE tokens can end in the middle of a multi-byte UTF-8 character
+    (common for Polish diacritics), in which case the decoded text ends with
+    U+FFFD. Such deltas are held back until later tokens complete the character.
+    Only a short window of recent tokens is re-decoded on every step.
+    """
+    def __init__(self, tokenizer, prompt_ids, window=6):
+        self.tokenizer = tokenizer
+        self.ids = list(prompt_ids)
+        self.prefix_offset = max(len(self.ids) - window, 0)
+        self.read_offset = len(self.ids)
+
+    def _delta(self):
+        prefix_text = self.tokenizer.decode(self.ids[self.prefix_offset:self.read_offset])
+        new_text = self.tokenizer.decode(self.ids[self.prefix_offset:])
+        return prefix_text, new_text
+
+    def push(self, token_id):
+        self.ids.append(token_id)
+        prefix_text, new_text = self._delta()
+        if len(new_text) <= len(prefix_text) or new_text.endswith('\ufffd'):
+            return ''
+        self.prefix_offset = self.read_offset
+        self.read_offset = len(self.ids)
+        return new_text[len(prefix_text):]
+
+    def flush(self):
+        """Return whatever is still held back, even if it is an incomplete character."""
+        prefix_text, new_text = self._delta()
+        self.prefix_offset = self.read_offset = len(self.ids)
+        return new_text[len(prefix_text):]
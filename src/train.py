@@ -0,0 +1,312 @@
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+import config
+from src.checkpoint import CheckpointWriter
+from src.data import BatchPrefetcher, TokenDataset
+from src.evaluate import AsyncEvaluator, evaluate_model
+from src.model import TransformerDecoder, convert_legacy_state_dict
+
+logger = logging.getLogger("IncunabuLM")
+
+def load_config(overrides=None):
+    """Snapshot of the upper-case settings in config.py, with optional overrides."""
+    cfg = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    cfg.update(overrides or {})
+    return SimpleNamespace(**cfg)
+
+def get_lr(it, cfg):
+    # Linear warmup followed by cosine decay down to MIN_LEARNING_RATE
+    if it < cfg.WARMUP_ITERS:
+        return cfg.LEARNING_RATE * it / cfg.WARMUP_ITERS
+    if it > cfg.MAX_ITERS:
+        return cfg.MIN_LEARNING_RATE
+
+    decay_ratio = (it - cfg.WARMUP_ITERS) / (cfg.MAX_ITERS - cfg.WARMUP_ITERS)
+    assert 0 <= decay_ratio <= 1
+    coeff = 0.5 * (1.0 + math.cos(math.pi * decay_ratio))
+    return cfg.MIN_LEARNING_RATE + coeff * (cfg.LEARNING_RATE - cfg.MIN_LEARNING_RATE)
+
+class Trainer:
+    """
+    Pretraining / fine-tuning loop from IncunabuLM.ipynb.
+
+    One iteration is one optimizer step made of ACCUMULATION_STEPS micro-batches.
+    Every CHECKPOINT_INTERVAL iterations the full state (model, optimizer,
+    GradScaler, iteration, best validation loss and every RNG) is written to
+    <out_dir>/last.pth, from which resume() continues exactly where training
+    stopped. The best model by validation loss is additionally saved as a plain
+    state_dict loadable by main.py.
+    """
+    def __init__(self, cfg=None, data_dir=None, out_dir=None, device=None, init_from=None):
+        self.cfg = cfg or load_config()
+        cfg = self.cfg
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.out_dir = out_dir or cfg.CHECKPOINT_DIR
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        random.seed(cfg.SEED)
+        np.random.seed(cfg.SEED)
+        torch.manual_seed(cfg.SEED)
+
+        self.dataset = TokenDataset(data_dir or cfg.DATA_DIR, val_fraction=cfg.VAL_FRACTION)
+
+        self.model = TransformerDecoder(cfg.VOCAB_SIZE, cfg.N_EMBD, cfg.BLOCK_SIZE, cfg.N_HEAD, cfg.N_LAYER, cfg.DROPOUT)
+        if init_from:
+            logger.info(f"Loading weights from base model: {init_from}")
+            state_dict = torch.load(init_from, map_location='cpu', weights_only=False)
+            state_dict = state_dict.get('model', state_dict)
+            self.model.load_state_dict(convert_legacy_state_dict(state_dict))
+        self.model.to(self.device)
+
+        self.optimizer = torch.optim.AdamW(self.model.parameters(), lr=cfg.LEARNING_RATE, weight_decay=cfg.WEIGHT_DECAY)
+
+        if self.device == 'cuda':
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            self.ctx = torch.amp.autocast(device_type='cuda', dtype=dtype)
+        else:
+            dtype = torch.float32
+            self.ctx = nullcontext()
+        self.scaler = torch.amp.GradScaler(enabled=(dtype == torch.float16))
+
+        self.compiled_model = torch.compile(self.model) if cfg.COMPILE else self.model
+        self.writer = CheckpointWriter()
+        self.evaluator = None
+        if cfg.EVAL_MODE == 'process':
+            self.evaluator = AsyncEvaluator(self.dataset.path, device=cfg.EVAL_DEVICE, out_dir=self.out_dir)
+
+        self.iter = 0
+        self.best_val_loss = float('inf')
+        self.batch_index = {'train': 0, 'val': 0}
+        self.loaders = {}
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.out_dir, 'last.pth')
+
+    @property
+    def best_model_path(self):
+        return os.path.join(self.out_dir, 'best_model.pth')
+
+    def state_dict(self):
+        rng_state = {
+            'python': random.getstate(),
+            'numpy': np.random.get_state(),
+            'torch': torch.get_rng_state(),
+        }
+        if torch.cuda.is_available():
+            rng_state['cuda'] = torch.cuda.get_rng_state_all()
+        return {
+            'model': self.model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'scaler': self.scaler.state_dict(),
+            'iter': self.iter,
+            'best_val_loss': self.best_val_loss,
+            'batch_index': {split: loader.index for split, loader in self.loaders.items()} or self.batch_index,
+            'rng': rng_state,
+            'config': vars(self.cfg),
+        }
+
+    def load_state_dict(self, state):
+        self.model.load_state_dict(state['model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scaler.load_state_dict(state['scaler'])
+        self.iter = state['iter']
+        self.best_val_loss = state['best_val_loss']
+        self.batch_index = dict(state['batch_index'])
+
+        rng_state = state['rng']
+        random.setstate(rng_state['python'])
+        if 'numpy' in rng_state:
+            np.random.set_state(rng_state['numpy'])
+        torch.set_rng_state(rng_state['torch'])
+        if 'cuda' in rng_state and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(rng_state['cuda'])
+
+    def resume(self, path=None):
+        path = path or self.checkpoint_path
+        logger.info(f"Resuming from {path}")
+        # Loaded on the CPU, where the RNG states must stay; load_state_dict moves the
+        # model and optimizer tensors to the device of the parameters
+        self.load_state_dict(torch.load(path, map_location='cpu', weights_only=False))
+        logger.info(f"Resumed at iteration {self.iter}, best val loss {self.best_val_loss:.4f}")
+
+    def save_checkpoint(self, evaluate=False):
+        on_saved = self.evaluator.submit if evaluate and self.evaluator is not None else None
+        self.writer.save(self.state_dict(), self.checkpoint_path, on_saved=on_saved)
+
+    def open_loaders(self):
+        self.close_loaders()
+        for split in ('train', 'val'):
+            self.loaders[split] = BatchPrefetcher(
+                self.dataset, split, self.cfg.BATCH_SIZE, self.cfg.BLOCK_SIZE,
+                device=self.device,
+                num_workers=self.cfg.LOADER_WORKERS,
+                prefetch=self.cfg.PREFETCH_BATCHES,
+                seed=self.cfg.SEED,
+                start=self.batch_index[split],
+                packed=self.cfg.PACKED_SEQUENCES
+            )
+
+    def close_loaders(self):
+        for split, loader in self.loaders.items():
+            self.batch_index[split] = loader.index
+            loader.close()
+        self.loaders = {}
+
+    def get_batch(self, split):
+        """(x, y, model keyword arguments) of the next batch; packed batches also carry position and document ids."""
+        xb, yb, *packing = next(self.loaders[split])
+        return xb, yb, dict(zip(('position_ids', 'document_ids'), packing))
+
+    def compute_loss(self, xb, yb, **kwargs):
+        _, loss = self.compiled_model(xb, yb, **kwargs)
+        return loss
+
+    @torch.no_grad()
+    def estimate_loss(self):
+        out = {}
+        self.compiled_model.eval()
+        for split in ['train', 'val']:
+            losses = torch.zeros(self.cfg.EVAL_ITERS)
+            for k in range(self.cfg.EVAL_ITERS):
+                X, Y, kwargs = self.get_batch(split)
+                with self.ctx:
+                    _, loss = self.compiled_model(X, Y, **kwargs)
+                losses[k] = loss.item()
+            out[split] = losses.mean().item()
+        self.compiled_model.train()
+        return out
+
+    def evaluate_fixed(self):
+        return {
+            split: evaluate_model(self.compiled_model, self.dataset, split, self.cfg.BLOCK_SIZE, self.cfg.BATCH_SIZE,
+                                  self.device, self.cfg.EVAL_WINDOWS, self.ctx)['loss']
+            for split in ('train', 'val')
+        }
+
+    def evaluate(self):
+        """
+        EVAL_MODE selects how the model is evaluated every EVAL_INTERVAL iterations:
+        'random' samples EVAL_ITERS random batches per split like the notebook,
+        'fixed' uses the same EVAL_WINDOWS non-overlapping windows every time, and
+        'process' saves a checkpoint and evaluates it in a separate process while
+        training continues (results go to <out_dir>/eval.jsonl).
+        """
+        if self.cfg.EVAL_MODE == 'process':
+            self.save_checkpoint(evaluate=True)
+            return
+        losses = self.evaluate_fixed() if self.cfg.EVAL_MODE == 'fixed' else self.estimate_loss()
+        logger.info(f"Step {self.iter}: train loss {losses['train']:.4f}, val loss {losses['val']:.4f}")
+        if losses['val'] < self.best_val_loss:
+            self.best_val_loss = losses['val']
+            self.writer.save(self.model.state_dict(), self.best_model_path)
+            logger.info(f"===> New best model saved to {self.best_model_path} with val_loss: {self.best_val_loss:.4f} <===")
+
+    def train_step(self):
+        cfg = self.cfg
+        lr = get_lr(self.iter, cfg)
+        for param_group in self.optimizer.param_groups:
+            param_group['lr'] = lr
+
+        total_loss = 0.0
+        for _ in range(cfg.ACCUMULATION_STEPS):
+            xb, yb, kwargs = self.get_batch('train')
+            with self.ctx:
+                loss = self.compute_loss(xb, yb, **kwargs) / cfg.ACCUMULATION_STEPS
+            self.scaler.scale(loss).backward()
+            total_loss += loss.detach()
+
+        self.scaler.unscale_(self.optimizer)
+        torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=cfg.CLIP_GRAD_NORM)
+        self.scaler.step(self.optimizer)
+        self.scaler.update()
+        self.optimizer.zero_grad(set_to_none=True)
+        self.iter += 1
+        return float(total_loss), lr
+
+    def train(self):
+        cfg = self.cfg
+        logger.info(f"Training on {self.device} from iteration {self.iter} to {cfg.MAX_ITERS}")
+        self.open_loaders()
+        self.compiled_model.train()
+        self.optimizer.zero_grad(set_to_none=True)
+
+        try:
+            while self.iter < cfg.MAX_ITERS:
+                if self.iter % cfg.EVAL_INTERVAL == 0 or self.iter == cfg.MAX_ITERS - 1:
+                    self.evaluate()
+
+                start = time.perf_counter()
+                loss, lr = self.train_step()
+                if self.iter % cfg.LOG_INTERVAL == 0:
+                    step_ms = (time.perf_counter() - start) * 1000
+                    stats = self.loaders['train'].stats()
+                    wait_ms = stats['mean_wait_ms'] * cfg.ACCUMULATION_STEPS
+                    packing = f", {stats['utilization']:.0%} of tokens used" if cfg.PACKED_SEQUENCES else ''
+                    logger.info(f"Iter {self.iter}: loss {loss:.4f}, lr {lr:.2e}, {step_ms:.0f} ms, data wait {wait_ms:.0f} ms/step{packing}")
+
+                if self.iter % cfg.CHECKPOINT_INTERVAL == 0:
+                    self.save_checkpoint()
+
+        except KeyboardInterrupt:
+            logger.info("Training interrupted by user. Saving checkpoint...")
+        finally:
+            self.save_checkpoint()
+            self.writer.wait()
+            self.close_loaders()
+            if self.evaluator is not None:
+                self.evaluator.wait()
+
+def parse_overrides(items):
+    overrides = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        default = getattr(config, name, None)
+        if isinstance(default, bool):
+            overrides[name] = value.lower() in ('1', 'true', 'yes')
+        elif default is not None:
+            overrides[name] = type(default)(value)
+        else:
+            overrides[name] = value
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or fine-tune IncunabuLM.")
+    parser.add_argument('--data-dir', help="Directory written by utilis/tokenize_corpus.py (default: config.DATA_DIR)")
+    parser.add_argument('--out-dir', help="Checkpoint directory (default: config.CHECKPOINT_DIR)")
+    parser.add_argument('--init-from', help="Start from these model weights, e.g. the base model when fine-tuning")
+    parser.add_argument('--resume', action='store_true', help="Continue from <out-dir>/last.pth")
+    parser.add_argument('--device')
+    parser.add_argument('--set', nargs='*', metavar='NAME=VALUE', help="Override config.py values, e.g. MAX_ITERS=3000")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    trainer = Trainer(
+        load_config(parse_overrides(args.set)),
+        data_dir=args.data_dir,
+        out_dir=args.out_dir,
+        device=args.device,
+        init_from=args.init_from
+    )
+    if args.resume:
+        trainer.resume()
+    trainer.train()
+
+if __name__ == '__main__':
+    main()
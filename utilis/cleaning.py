@@ -0,0 +1,271 @@
+import argparse
+import collections
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utilis.corpus_index import atomic_output
+
+# Text cleaning shared by the Wolne Lektury scrapers, also usable on its own over a
+# corpus directory:
+#   python -m utilis.cleaning data/raw data/clean [--workers 8] [--latin]
+#
+# Same output as the per-call versions it replaces (golden check in
+# benchmarks/cleaning_golden.py, throughput in benchmarks/bench_cleaning.py), but every pattern is compiled once, the
+# title and author names are found in one scan of a single alternation, and the
+# stop-word language check counts the sample's words once for all languages.
+
+END_OF_TEXT_TOKEN = "<|endoftext|>"
+MIN_BOOK_LENGTH_CHARS = 100
+READ_CHUNK_CHARS = 1 << 22
+
+# Słownik "stop-słów" do wykrywania i wykluczania języków obcych.
+# Jeśli w próbce tekstu znajdzie się więcej niż `threshold` słów z którejkolwiek listy,
+# tekst zostanie odrzucony.
+STOP_WORDS = {
+    'english': {'the', 'and', 'for', 'with', 'that', 'this', 'you', 'was'},
+    'german': {'das', 'der', 'die', 'und', 'ist', 'ein', 'ich', 'mit'},
+    'latin': {'et', 'in', 'est', 'cum', 'ad', 'quod', 'qui', 'non', 'ut'},
+    'french': {'de', 'la', 'le', 'et', 'est', 'un', 'une', 'à', 'pour'},
+    'ukrainian': {'і', 'в', 'на', 'з', 'та', 'що', 'не', 'до', 'як'},
+    'lithuanian': {'ir', 'yra', 'kad', 'į', 'su', 'kaip', 'iš', 'bet'}
+}
+LANGUAGE_DETECTION_THRESHOLD = 5 # Próg (liczba słów), po którym tekst jest odrzucany
+LANGUAGE_SAMPLE_CHARS = 2000 # Liczba znaków z początku tekstu do analizy
+
+LATIN_WORDS = (
+    'et', 'in', 'est', 'cum', 'ad', 'quod', 'qui', 'non', 'ut', 'de', 'aut', 'sed', 'per', 'quo', 'sunt', 'enim', 'vero',
+    'etiam', 'nam', 'autem', 'tamen', 'ita', 'sic', 'vel', 'ac', 'ab', 'ex', 'hic', 'ille', 'is', 'idem', 'ipse', 'iste',
+    'hic', 'haec', 'hoc', 'nunc', 'tunc', 'semper', 'saecula', 'saeculorum', 'amen'
+)
+
+# The (?=[...]) lookaheads only list the characters a match can start with, so the
+# engine skips other positions without trying every alternative; they match the same.
+WORD_REGEX = re.compile(r'\b\w+\b')
+FOOTER_REGEX = re.compile(
+    r'(?=[-PTŹ])(' + '|'.join([
+        r'-----*', r'Przypisy', r'Ten utwór nie jest objęty majątkowym prawem autorskim', r'Źródło:'
+    ]) + r')',
+    re.IGNORECASE
+)
+ISBN_REGEX = re.compile(r'^.*ISBN.*$', re.MULTILINE)
+DATE_REGEX = re.compile(
+    r'^\s*(poniedziałek|wtorek|środa|czwartek|piątek|sobota|niedziela),\s*\d{1,2}\s+\w+\s+\d{4}\s*$',
+    re.MULTILINE | re.IGNORECASE
+)
+CHAPTER_REGEX = re.compile(r'^\s*(ROZDZIAŁ|rozdział|KSIĘGA|Księga|PIEŚŃ|Pieśń|AKT|Akt)\s+[IVXLCDM\d]+\s*$', re.MULTILINE)
+PAGE_REGEX = re.compile(r'\[\s*strona\s+\d+\s*\]')
+LATIN_REGEX = re.compile(
+    r'\b(?=[' + ''.join(sorted({word[0] for word in LATIN_WORDS})) + r'])(' + '|'.join(LATIN_WORDS) + r')\b',
+    re.IGNORECASE
+)
+SPACES_REGEX = re.compile(r'\s{2,}')
+BLANK_LINES_REGEX = re.compile(r'\n\s*\n')
+
+def foreign_language(text: str):
+    """
+    (język, liczba słów) pierwszego języka z STOP_WORDS, którego stop-słów jest
+    w próbce więcej niż LANGUAGE_DETECTION_THRESHOLD, albo None.
+    """
+    counts = collections.Counter(WORD_REGEX.findall(text[:LANGUAGE_SAMPLE_CHARS].lower()))
+    for lang, stop_words_set in STOP_WORDS.items():
+        count = sum(counts[word] for word in stop_words_set)
+        if count > LANGUAGE_DETECTION_THRESHOLD:
+            return lang, count
+    return None
+
+def is_polish(text: str) -> bool:
+    return foreign_language(text) is None
+
+def remove_names(text: str, names: list) -> str:
+    """
+    Same result as `re.sub(re.escape(name), '', text, flags=re.IGNORECASE)` for
+    each of names in turn, in a single scan of the whole text.
+
+    One alternation of all names finds every place where any of them occurs;
+    most of a book has none and is kept as is. The sequential removals then
+    only run on windows around those places. Each pass can only reach less
+    than one name length further than the previous ones (by removing a name
+    formed where text was joined), so windows (passes + 1) name lengths wider
+    than the matches come out exactly as in the whole text.
+    """
+    names = [name for name in names if name]
+    if not names:
+        return text
+    name_regexes = [re.compile(re.escape(name), re.IGNORECASE) for name in names]
+    if len(names) == 1:
+        return name_regexes[0].sub('', text)
+    unique = list(dict.fromkeys(names))
+    first_chars = ''.join(sorted({re.escape(name[0]) for name in unique}))
+    regex = re.compile(f"(?=[{first_chars}])(?:{'|'.join(re.escape(name) for name in unique)})", re.IGNORECASE)
+    margin = (len(names) + 1) * max(len(name) for name in names)
+    windows = []
+    for match in regex.finditer(text):
+        start, end = max(match.start() - margin, 0), match.end() + margin
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = end
+        else:
+            windows.append([start, end])
+    if not windows:
+        return text
+    if sum(end - start for start, end in windows) > len(text) // 2:
+        # Names all over the text, whole passes are cheaper than many small ones
+        windows = [[0, len(text)]]
+
+    pieces = []
+    kept_from = 0
+    for start, end in windows:
+        window = text[start:end]
+        for name_regex in name_regexes:
+            window = name_regex.sub('', window)
+        pieces.append(text[kept_from:start])
+        pieces.append(window)
+        kept_from = end
+    pieces.append(text[kept_from:])
+    return ''.join(pieces)
+
+def remove_latin(text: str) -> str:
+    """
+    Usuwa popularne, samodzielne słowa łacińskie z tekstu,
+    które często występują w starszej poezji.
+    """
+    return SPACES_REGEX.sub(' ', LATIN_REGEX.sub('', text))
+
+def name_patterns(title: str, authors: list, surname_needs_first_name=False) -> list:
+    """
+    Tytuł, pełne imiona i nazwiska autorów oraz same nazwiska dłuższe niż 3 znaki,
+    w kolejności usuwania. get_finetuning_poems.py usuwa samo nazwisko tylko, gdy
+    autor ma też imię (surname_needs_first_name).
+    """
+    names = [title]
+    for author_info in authors:
+        full_name = author_info.get("name", "")
+        if full_name:
+            names.append(full_name)
+            if surname_needs_first_name and ' ' not in full_name:
+                continue
+            last_name = full_name.split()[-1]
+            if len(last_name) > 3:
+                names.append(last_name)
+    return names
+
+def clean_text(text: str, title: str, authors: list, latin=False, surname_needs_first_name=False) -> str:
+    """
+    Czyści tekst z niepotrzebnych elementów: stopki, metadanych, tytułów,
+    autorów oraz (jeśli latin) wtrąceń łacińskich.
+    """
+    # Usunięcie stopki i informacji o źródle
+    footer = FOOTER_REGEX.search(text)
+    cleaned_text = text[:footer.start()] if footer else text
+
+    # Usunięcie nagłówka Wolnych Lektur
+    last_dash_index = cleaned_text.rfind('---')
+    if last_dash_index != -1:
+        cleaned_text = cleaned_text[last_dash_index + 3:]
+
+    # Usunięcie tytułu i autora z tekstu
+    cleaned_text = remove_names(cleaned_text, name_patterns(title, authors, surname_needs_first_name))
+
+    # Usunięcie różnych znaczników i metadanych
+    cleaned_text = ISBN_REGEX.sub('', cleaned_text)
+    cleaned_text = DATE_REGEX.sub('', cleaned_text)
+    cleaned_text = CHAPTER_REGEX.sub('', cleaned_text)
+    cleaned_text = PAGE_REGEX.sub('', cleaned_text)
+    if latin:
+        cleaned_text = remove_latin(cleaned_text)
+
+    # Normalizacja pustych linii
+    cleaned_text = BLANK_LINES_REGEX.sub('\n', cleaned_text)
+    return cleaned_text.strip()
+
+def iter_documents(path, separator=END_OF_TEXT_TOKEN, chunk_chars=READ_CHUNK_CHARS):
+    """Yield the text between separators without loading the whole file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        while chunk := f.read(chunk_chars):
+            buffer += chunk
+            *documents, buffer = buffer.split(separator)
+            yield from documents
+        yield buffer
+
+def clean_document(text, latin=False, min_chars=MIN_BOOK_LENGTH_CHARS):
+    """Cleaned document, or None if it is too short or not in Polish. Documents of a corpus file carry no title or authors."""
+    if len(text) < min_chars or not is_polish(text):
+        return None
+    return clean_text(text, '', [], latin=latin) or None
+
+def _clean_batch(documents, latin, min_chars):
+    return [clean_document(text, latin, min_chars) for text in documents]
+
+def _iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def clean_corpus(input_dir, output_dir, workers=None, latin=False, min_chars=MIN_BOOK_LENGTH_CHARS, batch_documents=64):
+    """
+    Clean every .txt file under input_dir (documents separated by END_OF_TEXT_TOKEN)
+    into the same relative path under output_dir. Documents are read, cleaned on a
+    process pool and written back in order, batch_documents at a time with at most
+    two batches per worker in flight, so memory does not grow with the corpus.
+    Each output replaces an existing file only once complete, so output_dir may
+    be input_dir to clean in place; an output_dir inside input_dir is not cleaned
+    again. Returns (documents read, documents kept, characters written).
+    """
+    read = kept = written = 0
+    workers = workers or os.cpu_count()
+    window = 2 * workers
+    output_root = os.path.realpath(output_dir)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for dirpath, dirnames, filenames in os.walk(input_dir):
+            dirnames[:] = sorted(d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) != output_root)
+            for filename in sorted(filenames):
+                if not filename.endswith('.txt'):
+                    continue
+                input_path = os.path.join(dirpath, filename)
+                output_path = os.path.join(output_dir, os.path.relpath(input_path, input_dir))
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                with atomic_output(output_path) as f_out:
+                    in_flight = collections.deque()
+
+                    def drain(limit):
+                        nonlocal kept, written
+                        while len(in_flight) > limit:
+                            for text in in_flight.popleft().result():
+                                if text:
+                                    text = f"{text}\n{END_OF_TEXT_TOKEN}\n"
+                                    f_out.write(text.encode('utf-8'))
+                                    kept += 1
+                                    written += len(text)
+
+                    for batch in _iter_batches((d for d in iter_documents(input_path) if d.strip()), batch_documents):
+                        read += len(batch)
+                        in_flight.append(pool.submit(_clean_batch, batch, latin, min_chars))
+                        drain(window)
+                    drain(0)
+                print(f"Oczyszczono {input_path} -> {output_path}")
+    return read, kept, written
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean a directory of corpus .txt files on a process pool.")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument('--latin', action='store_true', help="Also remove Latin words (as for the poetry corpus)")
+    parser.add_argument('--min-chars', type=int, default=MIN_BOOK_LENGTH_CHARS)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    read, kept, written = clean_corpus(args.input_dir, args.output_dir, args.workers, args.latin, args.min_chars)
+    elapsed = time.perf_counter() - t0
+    print(f"Kept {kept} of {read} documents, {written / 2**20:.1f}M characters written in {elapsed:.1f}s "
+          f"({read / max(elapsed, 1e-9):.0f} documents/s)")
+
+if __name__ == '__main__':
+    main()
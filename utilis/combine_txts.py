@@ -1,56 +1,85 @@
+import argparse
 import os
 
+from utilis.corpus_index import COPY_CHUNK_BYTES, SEPARATOR, DocumentIndexer, atomic_output, index_path
+
+# Streams every .txt file under a folder into one corpus file, separated by
+# <|endoftext|>, and writes its byte-offset index (see corpus_index.py) on the way.
+# Files are copied in chunks, so memory does not depend on the corpus size; the
+# output and index only replace existing ones once complete.
+#
+#   python -m utilis.combine_txts [--root data/raw] [--output data/data_final.txt]
+
+ROOT_FOLDER = os.path.join('data', 'raw')
+OUTPUT_FILEPATH = os.path.join('data', 'data_final.txt')
+READ_CHUNK_CHARS = COPY_CHUNK_BYTES
+
+def iter_txt_files(root_folder):
+    # Sorted, so the same tree always combines into the same corpus
+    for dirpath, dirnames, filenames in os.walk(root_folder):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".txt"):
+                yield os.path.join(dirpath, filename)
+
 def combine_txt_files(root_folder, output_filepath):
     if not os.path.isdir(root_folder):
         print(f"Error: Root folder not found at path: {root_folder}")
         return
 
-    all_text_content = []
+    output_dir = os.path.dirname(output_filepath)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Created output directory: {output_dir}")
+
+    separator = f"\n\n{SEPARATOR}\n\n".encode('utf-8')
     file_count = 0
-    
     print(f"Starting search in: {root_folder}")
 
-    # os.walk recursively goes through the directory tree
-    for dirpath, _, filenames in os.walk(root_folder):
-        for filename in filenames:
-            if filename.endswith(".txt"):
-                file_path = os.path.join(dirpath, filename)
-                
+    try:
+        with atomic_output(output_filepath) as f_out, atomic_output(index_path(output_filepath)) as f_index:
+            indexer = DocumentIndexer(f_index)
+
+            def write(data):
+                f_out.write(data)
+                indexer.feed(data)
+
+            for file_path in iter_txt_files(root_folder):
+                state, position = indexer.state(), f_out.tell()
                 try:
+                    # Text mode, so line endings are normalized as before
                     with open(file_path, 'r', encoding='utf-8') as f:
-                        all_text_content.append(f.read())
-                        file_count += 1
-                        print(f"Adding file: {file_path}")
+                        if file_count:
+                            write(separator)
+                        while chunk := f.read(READ_CHUNK_CHARS):
+                            write(chunk.encode('utf-8'))
+                    file_count += 1
+                    print(f"Adding file: {file_path}")
                 except Exception as e:
+                    # Drop whatever was copied from the file before it failed
+                    f_out.truncate(position)
+                    f_out.seek(position)
+                    indexer.restore(state)
                     print(f"Could not read file {file_path}: {e}")
 
-    if not all_text_content:
-        print("No .txt files were found. Output file will not be created.")
-        return
-
-    # Join the content of all files, separated by a special token
-    separator = "\n\n<|endoftext|>\n\n"
-    final_text = separator.join(all_text_content)
-
-    try:
-        output_dir = os.path.dirname(output_filepath)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"Created output directory: {output_dir}")
-
-        with open(output_filepath, 'w', encoding='utf-8') as f_out:
-            f_out.write(final_text)
-        
-        print(f"\nSuccessfully combined {file_count} files.")
-        print(f"Output saved to: {output_filepath}")
+            if not file_count:
+                raise FileNotFoundError("No .txt files were found")
+            indexer.finish()
 
+    except FileNotFoundError as e:
+        print(f"{e}. Output file will not be created.")
+        return
     except Exception as e:
         print(f"An error occurred while writing the output file: {e}")
+        return
 
+    print(f"\nSuccessfully combined {file_count} files ({indexer.num_documents} documents).")
+    print(f"Output saved to: {output_filepath} (index: {index_path(output_filepath)})")
 
 if __name__ == '__main__':
-    ROOT_FOLDER = r'.\data\raw'
-    
-    OUTPUT_FILEPATH = r'.\data\data_final.txt'
-    
-    combine_txt_files(ROOT_FOLDER, OUTPUT_FILEPATH)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Combine a folder of .txt files into one indexed corpus file.")
+    parser.add_argument('--root', default=ROOT_FOLDER)
+    parser.add_argument('--output', default=OUTPUT_FILEPATH)
+    args = parser.parse_args()
+
+    combine_txt_files(args.root, args.output)
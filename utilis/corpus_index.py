@@ -0,0 +1,132 @@
+import os
+from array import array
+from contextlib import contextmanager
+
+# Byte-offset index of the documents of a corpus file, written next to it as
+# <corpus>.idx: one (start, end) pair of little-endian uint64 per document, the
+# span between two <|endoftext|> separators (or the file start/end). Used by
+# combine_txts.py, which writes it while combining, dedup.py, which hashes documents
+# by span on its workers, and shuffle_dataset.py, which permutes it instead of
+# loading the corpus.
+
+SEPARATOR = '<|endoftext|>'
+INDEX_SUFFIX = '.idx'
+COPY_CHUNK_BYTES = 1 << 22
+
+def index_path(corpus_path):
+    return corpus_path + INDEX_SUFFIX
+
+@contextmanager
+def atomic_output(path, mode='wb'):
+    """Write to a temporary file next to path and move it over path only once complete."""
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class DocumentIndexer:
+    """
+    Finds document boundaries in bytes fed in order, including separators split
+    across chunks, and appends each finished document's span to index_file.
+    Only the last len(separator) - 1 bytes are kept between chunks.
+    """
+    def __init__(self, index_file, separator=SEPARATOR):
+        self.index_file = index_file
+        self.separator = separator.encode('utf-8')
+        self.offset = 0
+        self.num_documents = 0
+        self._document_start = 0
+        self._tail = b''
+
+    def feed(self, chunk):
+        data = self._tail + chunk
+        base = self.offset - len(self._tail)
+        position = 0
+        while (found := data.find(self.separator, position)) != -1:
+            self._end_document(base + found)
+            position = found + len(self.separator)
+            self._document_start = base + position
+        self._tail = data[max(position, len(data) - len(self.separator) + 1):]
+        self.offset += len(chunk)
+
+    def _end_document(self, end):
+        array('Q', [self._document_start, end]).tofile(self.index_file)
+        self.num_documents += 1
+
+    def finish(self):
+        self._end_document(self.offset)
+
+    def state(self):
+        return self.offset, self.num_documents, self._document_start, self._tail
+
+    def restore(self, state):
+        """Roll back to an earlier state(), e.g. after a failed input was partially fed."""
+        self.offset, self.num_documents, self._document_start, self._tail = state
+        self.index_file.truncate(self.num_documents * 16)
+        self.index_file.seek(self.num_documents * 16)
+
+def build_index(corpus_path, separator=SEPARATOR):
+    """Scan an existing corpus file and write its index. Returns the number of documents."""
+    with open(corpus_path, 'rb') as f, atomic_output(index_path(corpus_path)) as index_file:
+        indexer = DocumentIndexer(index_file, separator)
+        while chunk := f.read(COPY_CHUNK_BYTES):
+            indexer.feed(chunk)
+        indexer.finish()
+    return indexer.num_documents
+
+def read_index(corpus_path):
+    """
+    (start, end) spans of the corpus documents as a flat uint64 array, 16 bytes per
+    document. The index is rebuilt if it is missing, older than the corpus or does
+    not end where the corpus does.
+    """
+    path = index_path(corpus_path)
+    stale = not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(corpus_path)
+    for _ in range(2):
+        if stale:
+            print(f"Indexing {corpus_path}...")
+            build_index(corpus_path)
+        spans = array('Q')
+        with open(path, 'rb') as f:
+            spans.fromfile(f, os.path.getsize(path) // spans.itemsize)
+        # An index not ending at the end of the corpus belongs to another version of it
+        stale = not spans or spans[-1] != os.path.getsize(corpus_path)
+        if not stale:
+            break
+    return spans
+
+def write_documents(output_file, documents, separator=SEPARATOR):
+    """
+    Write documents (str) stripped, each followed by "\n<separator>\n", together
+    with the index a scan of the result would give; both replace existing files
+    only once complete. Empty documents are skipped. Returns the number written.
+    """
+    separator = separator.encode('utf-8')
+    num_documents = 0
+    with atomic_output(output_file) as f_out, atomic_output(index_path(output_file)) as f_index:
+        document_start = 0
+        for document in documents:
+            document = document.strip()
+            if not document:
+                continue
+            f_out.write(document.encode('utf-8') + b'\n')
+            array('Q', [document_start, f_out.tell()]).tofile(f_index)
+            f_out.write(separator)
+            document_start = f_out.tell()
+            f_out.write(b'\n')
+            num_documents += 1
+        array('Q', [document_start, f_out.tell()]).tofile(f_index)
+    return num_documents
+
+def iter_documents(corpus_path, spans, order=None):
+    """Decoded documents of corpus_path, in index order or the given order of document numbers."""
+    with open(corpus_path, 'rb') as f:
+        for i in (range(len(spans) // 2) if order is None else order):
+            f.seek(spans[2 * i])
+            yield f.read(spans[2 * i + 1] - spans[2 * i]).decode('utf-8')
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utilis.corpus_index import iter_documents, read_index, write_documents
+
+# Removes near-duplicate documents from a corpus file (the same poem scraped through
+# several authors, anthologies or epochs) before it is shuffled and tokenized:
+#   combine_txts.py -> dedup.py -> shuffle_dataset.py -> tokenize_corpus.py
+#
+#   python -m utilis.dedup [--input data/data_final.txt] [--threshold 0.8] [--workers 8]
+#
+# Each document becomes a set of word shingles (shingle_size consecutive words,
+# lowercased) whose MinHash signature estimates the Jaccard similarity of two
+# documents as the fraction of equal values. Signatures are split into bands; two
+# documents whose signatures agree on a whole band land in the same LSH bucket and
+# become candidates, which is roughly linear in the corpus size instead of comparing
+# every pair. The bands are chosen so that pairs somewhat below threshold already
+# become candidates; those with an estimated similarity of at least threshold are
+# merged into clusters, of which only the longest document is kept. The removed
+# clusters are written to a JSON report. benchmarks/dedup_recall.py checks the
+# recall on planted near-duplicates.
+
+INPUT_FILE = 'data/data_final.txt'
+REPORT_FILE = 'data/dedup_report.json'
+THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+SEED = 1
+BATCH_DOCUMENTS = 256
+SHINGLE_BLOCK = 4096
+PREVIEW_CHARS = 120
+# Missing a near-duplicate costs more than a candidate pair rejected by verification
+FALSE_NEGATIVE_WEIGHT = 8.0
+
+SHINGLE_MULTIPLIER = np.uint64(0x100000001B3)
+WORD_REGEX = re.compile(r'\w+')
+
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    """Unique 32-bit hashes of the word shingles of text; documents shorter than a shingle are one shingle."""
+    words = WORD_REGEX.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint64, count=len(words))
+    k = min(shingle_size, len(words))
+    n = len(words) - k + 1
+    # Polynomial hash of each window of k words, wrapping around 2^64
+    hashes = np.zeros(n, dtype=np.uint64)
+    for i in range(k):
+        hashes = hashes * SHINGLE_MULTIPLIER + word_hashes[i:i + n]
+    return np.unique((hashes ^ (hashes >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+def hash_seeds(num_perm=NUM_PERM, seed=SEED):
+    """One random 64-bit seed per MinHash function, as a (num_perm, 1) column."""
+    return np.random.default_rng(seed).integers(0, np.iinfo(np.uint64).max, size=(num_perm, 1), dtype=np.uint64, endpoint=True)
+
+def _mix(z):
+    # splitmix64 finalizer, multiplications wrap around 2^64; every input bit affects
+    # every output bit, so the functions of different seeds order shingles independently
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def minhash(hashes, seeds):
+    """MinHash signature of a set of shingle hashes, computed over blocks of shingles to bound memory."""
+    signature = np.full(seeds.shape[0], np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), SHINGLE_BLOCK):
+        np.minimum(signature, _mix(hashes[None, start:start + SHINGLE_BLOCK] ^ seeds).min(axis=1), out=signature)
+    return signature
+
+def _signatures(corpus_path, spans, shingle_size, num_perm, seed):
+    seeds = hash_seeds(num_perm, seed)
+    signatures = np.empty((len(spans), num_perm), dtype=np.uint64)
+    with open(corpus_path, 'rb') as f:
+        for i, (start, end) in enumerate(spans):
+            f.seek(start)
+            signatures[i] = minhash(shingle_hashes(f.read(end - start).decode('utf-8'), shingle_size), seeds)
+    return signatures
+
+def compute_signatures(corpus_path, spans, shingle_size=SHINGLE_SIZE, num_perm=NUM_PERM, seed=SEED,
+                       workers=None, batch_documents=BATCH_DOCUMENTS):
+    """(documents, num_perm) signatures, batches of documents hashed on a process pool that reads them itself."""
+    pairs = [(spans[2 * i], spans[2 * i + 1]) for i in range(len(spans) // 2)]
+    batches = [pairs[i:i + batch_documents] for i in range(0, len(pairs), batch_documents)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_signatures, *zip(*[(corpus_path, batch, shingle_size, num_perm, seed) for batch in batches]))
+        return np.concatenate(list(results)) if batches else np.empty((0, num_perm), dtype=np.uint64)
+
+def lsh_params(threshold, num_perm=NUM_PERM, false_negative_weight=FALSE_NEGATIVE_WEIGHT):
+    """
+    (bands, rows) with bands * rows <= num_perm minimizing the probability mass of
+    false positives below threshold plus false_negative_weight times that of false
+    negatives above it, for candidates found when all rows of a band match:
+    P = 1 - (1 - s^rows)^bands. With the default weight the curve crosses 1/2 well
+    below threshold (about 0.75 for 0.8), so near-duplicates are rarely missed and
+    verification discards the extra candidates.
+    """
+    s = np.linspace(0, 1, 1001)
+    best = None
+    for rows in range(1, num_perm + 1):
+        for bands in range(1, num_perm // rows + 1):
+            p = 1 - (1 - s ** rows) ** bands
+            error = np.mean(np.where(s < threshold, p, false_negative_weight * (1 - p)))
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+def similarity(signatures, i, j):
+    return float(np.mean(signatures[i] == signatures[j]))
+
+def find_clusters(signatures, threshold=THRESHOLD, bands=None, rows=None):
+    """
+    Groups of near-duplicate documents (lists of document numbers, at least two).
+    Every document is compared with each earlier member of every bucket it falls
+    in that is not already in its cluster, so a bucket of copies of one text costs
+    one comparison per copy. Documents without any word have no signature and are
+    never grouped.
+    """
+    num_docs, num_perm = signatures.shape
+    if bands is None:
+        bands, rows = lsh_params(threshold, num_perm)
+    empty = (signatures == np.iinfo(np.uint64).max).all(axis=1)
+    clusters = UnionFind(num_docs)
+    for band in range(bands):
+        buckets = {}
+        band_signatures = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(num_docs):
+            if empty[i]:
+                continue
+            members = buckets.setdefault(band_signatures[i].tobytes(), [])
+            for j in members:
+                if clusters.find(j) != clusters.find(i) and similarity(signatures, j, i) >= threshold:
+                    clusters.union(j, i)
+            members.append(i)
+
+    groups = {}
+    for i in range(num_docs):
+        groups.setdefault(clusters.find(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+def _preview(text):
+    return ' '.join(text.split())[:PREVIEW_CHARS]
+
+def deduplicate(input_file, output_file=None, report_file=REPORT_FILE, threshold=THRESHOLD, shingle_size=SHINGLE_SIZE,
+                num_perm=NUM_PERM, seed=SEED, workers=None):
+    output_file = output_file or input_file
+    t0 = time.perf_counter()
+    spans = read_index(input_file)
+    num_docs = len(spans) // 2
+    lengths = [spans[2 * i + 1] - spans[2 * i] for i in range(num_docs)]
+    bands, rows = lsh_params(threshold, num_perm)
+    print(f"Hashing {num_docs} documents ({num_perm} hash functions, {bands} bands of {rows} rows)...")
+    signatures = compute_signatures(input_file, spans, shingle_size, num_perm, seed, workers)
+    clusters = find_clusters(signatures, threshold, bands, rows)
+
+    removed = set()
+    report_clusters = []
+    for group in clusters:
+        kept = max(group, key=lambda i: (lengths[i], -i))
+        duplicates = [i for i in group if i != kept]
+        removed.update(duplicates)
+        report_clusters.append({'kept': kept, 'removed': duplicates})
+
+    # Previews for the report, reading only the clustered documents
+    clustered = sorted({i for group in clusters for i in group})
+    previews = dict(zip(clustered, map(_preview, iter_documents(input_file, spans, clustered))))
+    for cluster in report_clusters:
+        kept = cluster['kept']
+        cluster['kept'] = {'document': kept, 'bytes': lengths[kept], 'preview': previews[kept]}
+        cluster['removed'] = [
+            {'document': i, 'bytes': lengths[i], 'similarity': similarity(signatures, kept, i), 'preview': previews[i]}
+            for i in cluster['removed']
+        ]
+
+    kept_documents = [i for i in range(num_docs) if i not in removed]
+    num_written = write_documents(output_file, iter_documents(input_file, spans, kept_documents))
+
+    report = {
+        'input': input_file,
+        'output': output_file,
+        'threshold': threshold,
+        'shingle_size': shingle_size,
+        'num_perm': num_perm,
+        'bands': bands,
+        'rows': rows,
+        'documents': num_docs,
+        'documents_written': num_written,
+        'removed_documents': len(removed),
+        'removed_bytes': sum(lengths[i] for i in removed),
+        'seconds': time.perf_counter() - t0,
+        'clusters': sorted(report_clusters, key=lambda c: -len(c['removed'])),
+    }
+    report_dir = os.path.dirname(report_file)
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"Removed {len(removed)} near-duplicates in {len(clusters)} clusters "
+          f"({report['removed_bytes'] / 2**20:.1f} MB), wrote {num_written} documents to {output_file}")
+    print(f"Report saved to {report_file}")
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Remove near-duplicate documents from a corpus file with MinHash LSH.")
+    parser.add_argument('--input', default=INPUT_FILE)
+    parser.add_argument('--output', default=None, help="Deduplicated corpus (default: replace the input)")
+    parser.add_argument('--report', default=REPORT_FILE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="Estimated Jaccard similarity of near-duplicates")
+    parser.add_argument('--shingle-size', type=int, default=SHINGLE_SIZE, help="Words per shingle")
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--workers', type=int, default=None, help="Processes (default: CPU count)")
+    args = parser.parse_args()
+
+    deduplicate(args.input, args.output, args.report, args.threshold, args.shingle_size, args.num_perm, args.seed, args.workers)
@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+
+# Shared downloader of the Wolne Lektury scrapers (get_training_data.py,
+# get_finetuning_poems.py). Requests run in a thread pool driven by asyncio:
+#   - at most `concurrency` requests in flight, started at most `rate` per second
+#     (token bucket, bursts of up to `burst`),
+#   - failed requests and 429/5xx responses are retried with exponential backoff,
+#   - responses carrying an ETag are kept in `cache_dir` and revalidated with
+#     If-None-Match, so a rerun downloads only what changed,
+#   - CorpusWriter appends every finished book to the output file right away and
+#     records it in a manifest, so a rerun skips completed books.
+#
+# base_url points the scrapers at another server, e.g. a local stub:
+#   python -m utilis.get_training_data --base-url http://127.0.0.1:8080/api/
+
+DEFAULT_BASE_URL = "https://wolnelektury.pl/api/"
+END_OF_TEXT_TOKEN = "<|endoftext|>"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, up to `burst` at once."""
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ContentCache:
+    """Response bodies that came with an ETag, one body and one metadata file per URL."""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{name}.body'), os.path.join(self.directory, f'{name}.json')
+
+    def etag(self, url):
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['etag']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def body(self, url):
+        """The cached body, or None if it was removed or cannot be read."""
+        body_path, _ = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, url, etag, body):
+        body_path, meta_path = self._paths(url)
+        # Body first: metadata without its body would turn a 304 into a miss
+        for path, data in ((body_path, body), (meta_path, json.dumps({'url': url, 'etag': etag}).encode('utf-8'))):
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+class Fetcher:
+    """
+    Async HTTP GETs with bounded concurrency, rate limiting, retries and an ETag
+    cache. Use as `async with Fetcher(...) as fetcher:`.
+    """
+    def __init__(self, base_url=DEFAULT_BASE_URL, concurrency=8, rate=5.0, burst=None,
+                 retries=4, backoff=0.5, timeout=30.0, cache_dir=None):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = ContentCache(cache_dir) if cache_dir else None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst or concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='fetcher')
+        self._local = threading.local()
+        self.stats = {'requests': 0, 'retries': 0, 'not_modified': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def url(self, path):
+        return urljoin(self.base_url, path)
+
+    def _session(self):
+        # requests.Session is not thread-safe, each pool thread keeps its own
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _get(self, url, etag):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self._session().get(url, headers=headers, timeout=self.timeout)
+
+    async def get_bytes(self, url):
+        etag = self.cache.etag(url) if self.cache else None
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            try:
+                async with self._semaphore:
+                    await self._bucket.acquire()
+                    self.stats['requests'] += 1
+                    response = await loop.run_in_executor(self._executor, self._get, url, etag)
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code == 304 and etag:
+                    body = self.cache.body(url)
+                    if body is not None:
+                        self.stats['not_modified'] += 1
+                        return body
+                    # The cached body is gone, ask again for the full response
+                    etag = None
+                    continue
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    response.raise_for_status()
+                    if self.cache and response.headers.get('ETag'):
+                        self.cache.store(url, response.headers['ETag'], response.content)
+                    return response.content
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            attempt += 1
+            self.stats['retries'] += 1
+            await asyncio.sleep(delay)
+
+    async def get_text(self, url):
+        return (await self.get_bytes(url)).decode('utf-8')
+
+    async def get_json(self, url):
+        return json.loads(await self.get_bytes(url))
+
+class CorpusWriter:
+    """
+    Appends texts separated by END_OF_TEXT_TOKEN to output_file and records each
+    finished key (book URL) in a JSON lines manifest, together with the output
+    size after it. On start the output is truncated to the last recorded size, so
+    a text cut short by a crash is dropped and fetched again.
+    """
+    def __init__(self, output_file, manifest_file=None):
+        self.output_file = output_file
+        self.manifest_file = manifest_file or output_file + '.manifest.jsonl'
+        self.done = set()
+        self.num_written = 0
+        size = 0
+        manifest_size = 0
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Interrupted while appending the last record
+                    self.done.add(record['key'])
+                    size = max(size, record['size'])
+                    manifest_size += len(line)
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self._output = open(output_file, 'ab')
+        self._output.truncate(size)
+        self._output.seek(size)
+        self._manifest = open(self.manifest_file, 'ab')
+        self._manifest.truncate(manifest_size)
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def _record(self, key, status):
+        self.done.add(key)
+        record = {'key': key, 'status': status, 'size': self._output.tell()}
+        self._manifest.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        self._manifest.flush()
+
+    def write(self, key, text):
+        start = self._output.tell()
+        try:
+            self._output.write(f"{text}\n{END_OF_TEXT_TOKEN}\n".encode('utf-8'))
+            self._output.flush()
+            os.fsync(self._output.fileno())
+        except OSError:
+            # Leave no partial text for the next book to be appended after
+            self._output.truncate(start)
+            self._output.seek(start)
+            raise
+        self.num_written += 1
+        self._record(key, 'written')
+
+    def skip(self, key):
+        """Remember a key whose text was rejected, so it is not fetched again."""
+        self._record(key, 'skipped')
+
+    @property
+    def size(self):
+        return self._output.tell()
+
+    def close(self):
+        self._output.close()
+        self._manifest.close()
+
+async def fetch_books(fetcher, writer, books, process):
+    """
+    Download every book of `books` (API summaries with an "href") not yet in the
+    writer, concurrently. process(raw_text, details) returns the text to write or
+    None to reject it. Books that failed for any reason (download, processing,
+    writing) are reported and left for the next run, the others carry on.
+    Texts are appended in the order they finish.
+    """
+    async def fetch(href):
+        try:
+            details = await fetcher.get_json(href)
+            txt_url = details.get("txt")
+            if not txt_url:
+                writer.skip(href)
+                return
+            text = process(await fetcher.get_text(txt_url), details)
+            if text:
+                writer.write(href, text)
+                print(f"     ... pobrano '{details.get('title', '')}'. Aktualny rozmiar zbioru: {writer.size / (1024*1024):.2f} MB")
+            else:
+                writer.skip(href)
+        except Exception as e:
+            print(f"Błąd podczas pobierania {href}: {e}")
+
+    hrefs = list(dict.fromkeys(b["href"] for b in books if b.get("href")))
+    pending = [href for href in hrefs if href not in writer]
+    print(f"{len(hrefs) - len(pending)} z {len(hrefs)} książek pobrano już wcześniej, pobieram pozostałe {len(pending)}...")
+    await asyncio.gather(*(fetch(href) for href in pending))
+
+def add_fetcher_arguments(parser, base_url=DEFAULT_BASE_URL):
+    parser.add_argument('--base-url', default=base_url, help="API root, e.g. a local stub server")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=5.0, help="Requests per second")
+    parser.add_argument('--retries', type=int, default=4)
+    parser.add_argument('--cache-dir', default='data/raw/http_cache', help="ETag cache of responses ('' disables it)")
+    parser.add_argument('--fresh', action='store_true', help="Start over instead of resuming from the manifest")
+
+def fetcher_from_args(args):
+    return Fetcher(args.base_url, concurrency=args.concurrency, rate=args.rate,
+                   retries=args.retries, cache_dir=args.cache_dir or None)
+
+def writer_from_args(args, output_file):
+    manifest_file = output_file + '.manifest.jsonl'
+    if args.fresh:
+        for path in (output_file, manifest_file):
+            if os.path.exists(path):
+                os.remove(path)
+    return CorpusWriter(output_file, manifest_file)
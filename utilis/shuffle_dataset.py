@@ -1,35 +1,48 @@
+import argparse
 import random
 
+from utilis.corpus_index import iter_documents, read_index, write_documents
+
+# Tasuje utwory korpusu bez wczytywania go do pamięci: permutuje indeks przesunięć
+# (corpus_index.py, budowany przy pierwszym użyciu, jeśli go nie ma) i kopiuje
+# utwory w nowej kolejności do pliku tymczasowego, który zastępuje wynik dopiero po
+# zapisaniu całości. W pamięci jest tylko indeks (16 bajtów na utwór) i jeden utwór.
+# To samo ziarno daje zawsze tę samą kolejność.
+#
+#   python -m utilis.shuffle_dataset [--input data/raw/poezja.txt] [--output ...] [--seed 42]
+
 INPUT_FILE = 'data/raw/poezja.txt'
 OUTPUT_FILE = 'data/raw/poezja.txt'
-SEPARATOR = '<|endoftext|>'
+SEED = 42
 
+def shuffle_corpus(input_file, output_file, seed=SEED):
+    print(f"Wczytywanie indeksu pliku: {input_file}...")
+    spans = read_index(input_file)
+    order = list(range(len(spans) // 2))
+    print(f"Znaleziono {len(order)} utworów.")
 
-print(f"Wczytywanie danych z pliku: {INPUT_FILE}...")
+    random.Random(seed).shuffle(order)
+    print(f"Utwory zostały wymieszane (ziarno {seed}).")
 
-try:
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    documents = list(filter(None, [doc.strip() for doc in content.split(SEPARATOR)]))
-    
-    if not documents:
+    # Wejście zostaje zamknięte po przeczytaniu ostatniego utworu, zanim wynik je
+    # podmieni, więc może to być ten sam plik
+    num_documents = write_documents(output_file, iter_documents(input_file, spans, order))
+    if not num_documents:
         raise ValueError("Nie znaleziono żadnych utworów do wymieszania. Sprawdź separator.")
 
-    print(f"Znaleziono {len(documents)} utworów.")
-
-    random.shuffle(documents)
-    print("Utwory zostały wymieszane.")
-
-    shuffled_content = f"\n{SEPARATOR}\n".join(documents)
-    shuffled_content += f"\n{SEPARATOR}\n"
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(shuffled_content)
-
-    print(f"Zapisano wymieszane dane do pliku: {OUTPUT_FILE}")
-
-except FileNotFoundError:
-    print(f"Błąd: Nie znaleziono pliku '{INPUT_FILE}'.")
-except Exception as e:
-    print(f"Wystąpił nieoczekiwany błąd: {e}")
\ No newline at end of file
+    print(f"Zapisano {num_documents} wymieszanych utworów do pliku: {output_file}")
+    return num_documents
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Out-of-core shuffle of the documents of a corpus file.")
+    parser.add_argument('--input', default=INPUT_FILE)
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args()
+
+    try:
+        shuffle_corpus(args.input, args.output, args.seed)
+    except FileNotFoundError:
+        print(f"Błąd: Nie znaleziono pliku '{args.input}'.")
+    except Exception as e:
+        print(f"Wystąpił nieoczekiwany błąd: {e}")
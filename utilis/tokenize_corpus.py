@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from tokenizers import Tokenizer
+
+# Streams a corpus produced by combine_txts.py through the BPE tokenizer and writes
+# uint16 token shards plus an index that src/data.py memory-maps for training.
+#
+# Output layout:
+#   index.json        - dtype, vocab size, shard list and document count
+#   shard_00000.bin   - raw uint16 token ids, shards concatenated form one stream
+#   offsets.bin       - uint64 start offset of every document in the stream
+
+INPUT_FILE = 'data/data_final.txt'
+OUTPUT_DIR = 'data/tokens'
+TOKENIZER_PATH = 'tokenizer/bpe_tokenizer.json'
+SEPARATOR = '<|endoftext|>'
+SHARD_TOKENS = 100_000_000
+BATCH_DOCUMENTS = 512
+READ_CHUNK_CHARS = 1 << 22
+
+def iter_documents(path, separator=SEPARATOR, chunk_chars=READ_CHUNK_CHARS):
+    """Yield the text between separators without loading the whole file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        while chunk := f.read(chunk_chars):
+            buffer += chunk
+            *documents, buffer = buffer.split(separator)
+            yield from documents
+        yield buffer
+
+def iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class ShardWriter:
+    def __init__(self, output_dir, shard_tokens):
+        self.output_dir = output_dir
+        self.shard_tokens = shard_tokens
+        self.shards = []
+        self.num_tokens = 0
+        self._file = None
+        self._written = 0
+
+    def _open_shard(self):
+        name = f'shard_{len(self.shards):05d}.bin'
+        self._file = open(os.path.join(self.output_dir, name), 'wb')
+        self._written = 0
+        self.shards.append({'file': name, 'num_tokens': 0})
+
+    def write(self, tokens):
+        while len(tokens):
+            if self._file is None or self._written == self.shard_tokens:
+                self.close()
+                self._open_shard()
+            n = min(len(tokens), self.shard_tokens - self._written)
+            tokens[:n].tofile(self._file)
+            self._written += n
+            self.num_tokens += n
+            self.shards[-1]['num_tokens'] = self._written
+            tokens = tokens[n:]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def tokenize_corpus(input_file, output_dir, tokenizer_path, shard_tokens=SHARD_TOKENS, batch_documents=BATCH_DOCUMENTS):
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+    vocab_size = tokenizer.get_vocab_size()
+    if vocab_size > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"Vocabulary of {vocab_size} tokens does not fit in uint16")
+    eot_token_id = tokenizer.token_to_id(SEPARATOR)
+
+    os.makedirs(output_dir, exist_ok=True)
+    writer = ShardWriter(output_dir, shard_tokens)
+    num_documents = 0
+
+    print(f"Tokenizing {input_file} into {output_dir}...")
+    with open(os.path.join(output_dir, 'offsets.bin'), 'wb') as offsets_file:
+        pending_separator = False
+        for batch in iter_batches(iter_documents(input_file), batch_documents):
+            # encode_batch tokenizes the documents in parallel on the Rust side
+            encodings = tokenizer.encode_batch(batch)
+            offsets = []
+            for encoding in encodings:
+                if pending_separator:
+                    # The separator closes the previous document, as in the original flat stream
+                    writer.write(np.array([eot_token_id], dtype=np.uint16))
+                offsets.append(writer.num_tokens)
+                writer.write(np.asarray(encoding.ids, dtype=np.uint16))
+                pending_separator = True
+            np.asarray(offsets, dtype=np.uint64).tofile(offsets_file)
+            num_documents += len(offsets)
+            print(f"  {num_documents} documents, {writer.num_tokens:,} tokens")
+    writer.close()
+
+    index = {
+        'dtype': 'uint16',
+        'vocab_size': vocab_size,
+        'eot_token_id': eot_token_id,
+        'num_tokens': writer.num_tokens,
+        'num_documents': num_documents,
+        'offsets': 'offsets.bin',
+        'shards': writer.shards,
+    }
+    with open(os.path.join(output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+
+    print(f"\nWrote {writer.num_tokens:,} tokens in {len(writer.shards)} shards to {output_dir}")
+    return index
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-tokenize a text corpus into memory-mappable uint16 shards.")
+    parser.add_argument('--input', default=INPUT_FILE)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--tokenizer', default=TOKENIZER_PATH)
+    parser.add_argument('--shard-tokens', type=int, default=SHARD_TOKENS)
+    args = parser.parse_args()
+
+    tokenize_corpus(args.input, args.output_dir, args.tokenizer, args.shard_tokens)